@@ -1,13 +1,11 @@
 import streamlit as st
-from src.loader import load_documents
+from src.loader import load_documents, load_buffers
 from src.chunking import chunk_documents
 from src.vectorstore import VectorStore
 from src.rag_pipeline import RAGPipeline
 from src.utils import ensure_directories
 from src.evaluation import analyze_confidence_distribution
 import os
-import tempfile
-from pathlib import Path
 
 
 # Page config
@@ -39,7 +37,7 @@ with st.sidebar:
 
     upload_method = st.radio(
         "Choose upload method:",
-        ["Upload files here", "Load from data/policies/"],
+        ["Upload files here", "Load from data/policies/", "Use existing index"],
         key="upload_method"
     )
 
@@ -52,40 +50,25 @@ with st.sidebar:
 
         if uploaded_files and st.button("Process Uploaded Files"):
             with st.spinner("Processing uploaded files..."):
-                from src.loader import load_pdf, load_text
-
-                docs = []
-                for uploaded_file in uploaded_files:
-                    try:
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as tmp_file:
-                            tmp_file.write(uploaded_file.getvalue())
-                            tmp_path = Path(tmp_file.name)
-
-                        if tmp_path.suffix.lower() == ".pdf":
-                            text = load_pdf(tmp_path)
-                        elif tmp_path.suffix.lower() in [".txt", ".md"]:
-                            text = load_text(tmp_path)
-                        else:
-                            continue
-
-                        if text.strip():
-                            docs.append({
-                                "text": text,
-                                "metadata": {
-                                    "source": uploaded_file.name,
-                                    "type": tmp_path.suffix[1:]
-                                }
-                            })
-
-                        tmp_path.unlink()
-
-                    except Exception as e:
-                        st.error(f"Error processing {uploaded_file.name}: {e}")
+                progress = st.progress(0.0, text="Extracting text...")
+
+                def report_progress(done, total, name, error):
+                    progress.progress(done / total, text=f"Extracted {done}/{total}: {name}")
+
+                docs, errors = load_buffers(
+                    [(f.name, f.getvalue()) for f in uploaded_files],
+                    progress_callback=report_progress
+                )
+
+                for name, error in errors:
+                    st.error(f"Error processing {name}: {error}")
 
                 if docs:
                     chunked = chunk_documents(docs, chunk_size=500, overlap=100)
 
                     vector_store = VectorStore()
+                    # Concurrent sessions share one query-embedding micro-batcher
+                    vector_store.enable_query_batching()
                     vector_store.reset()
                     vector_store.add_documents(chunked)
 
@@ -97,6 +80,23 @@ with st.sidebar:
                 else:
                     st.warning("No valid documents were processed")
 
+    elif upload_method == "Use existing index":
+        if st.button("Open Index"):
+            with st.spinner("Opening index..."):
+                vector_store = VectorStore()
+                # Concurrent sessions share one query-embedding micro-batcher
+                vector_store.enable_query_batching()
+                if vector_store.count():
+                    st.session_state.vector_store = vector_store
+                    st.session_state.rag_pipeline = RAGPipeline(vector_store)
+                    st.session_state.uploaded_files_count = len({
+                        (m or {}).get("source") for m in vector_store.collection.get(include=["metadatas"])["metadatas"]
+                    })
+
+                    st.success(f"Opened index with {vector_store.count()} chunks")
+                else:
+                    st.warning("The index in chroma_db/ is empty. Build it or import a snapshot first.")
+
     else:
         if st.button("Load Documents from Folder"):
             with st.spinner("Loading documents..."):
@@ -105,6 +105,8 @@ with st.sidebar:
                     chunked = chunk_documents(docs, chunk_size=500, overlap=100)
 
                     vector_store = VectorStore()
+                    # Concurrent sessions share one query-embedding micro-batcher
+                    vector_store.enable_query_batching()
                     vector_store.reset()
                     vector_store.add_documents(chunked)
 
@@ -146,11 +148,17 @@ else:
     if question:
         if prompt_type == "compare":
 
+            with st.spinner("Searching..."):
+                results = st.session_state.rag_pipeline.query_variants(
+                    question, prompt_types=["initial", "improved"]
+                )
+            result_initial = results["initial"]
+            result_improved = results["improved"]
+
             colA, colB = st.columns(2)
 
             with colA:
                 st.subheader("Initial Prompt Result")
-                result_initial = st.session_state.rag_pipeline.query(question, prompt_type="initial")
                 st.write(result_initial["answer"])
                 st.metric("Confidence", result_initial.get("confidence", "N/A"))
                 if result_initial.get("evaluation"):
@@ -158,7 +166,6 @@ else:
 
             with colB:
                 st.subheader("Improved Prompt Result")
-                result_improved = st.session_state.rag_pipeline.query(question, prompt_type="improved")
                 st.write(result_improved["answer"])
                 st.metric("Confidence", result_improved.get("confidence", "N/A"))
                 if result_improved.get("evaluation"):
@@ -171,6 +178,8 @@ else:
                 response = st.session_state.rag_pipeline.query(question, prompt_type=prompt_type)
 
             st.markdown("### Answer")
+            if response.get("degraded"):
+                st.warning(f"Degraded response ({response['degraded']}): a stage missed its deadline.")
             st.write(response["answer"])
 
             col1, col2 = st.columns(2)
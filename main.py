@@ -1,5 +1,7 @@
 import sys
 import os
+import argparse
+import json
 from dotenv import load_dotenv
 
 from src.loader import load_documents
@@ -7,12 +9,29 @@ from src.chunking import chunk_documents
 from src.vectorstore import VectorStore
 from src.rag_pipeline import RAGPipeline
 from src.utils import ensure_directories
+from src.batch import read_questions, run_batch
+from src.embeddings import EMBEDDING_BACKENDS, validate_backend
+from src.snapshot import export_snapshot, import_snapshot
+from src.evaluation import (
+    collect_relevance_features,
+    load_relevance_features_from_log,
+    calibrate_relevance_threshold,
+    load_retrieval_eval_set,
+    hnsw_grid,
+    sweep_retrieval_params,
+    format_results_table
+)
 
 # Load environment variables
 load_dotenv()
 
 
-def setup_vector_store():
+def setup_vector_store(
+    num_workers: int = 1,
+    embedding_backend: str = "torch",
+    chunk_size: int = 500,
+    overlap: int = 100
+):
     """Initialize and populate vector store."""
     print("Loading documents...")
     docs = load_documents()
@@ -24,21 +43,229 @@ def setup_vector_store():
     print(f"Loaded {len(docs)} documents")
 
     print("Chunking documents...")
-    chunked = chunk_documents(docs, chunk_size=500, overlap=100)
+    chunked = chunk_documents(docs, chunk_size=chunk_size, overlap=overlap)
     print(f"Created {len(chunked)} chunks")
 
     print("Initializing vector store...")
-    vector_store = VectorStore()
+    vector_store = VectorStore(embedding_backend=embedding_backend)
     vector_store.reset()
-    vector_store.add_documents(chunked)
+    vector_store.add_documents(chunked, num_workers=num_workers)
 
     print("Setup complete!")
     return vector_store
 
 
+def int_list(value: str):
+    """Parse a comma-separated list of integers."""
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Policy RAG Assistant CLI")
+    parser.add_argument("question", nargs="*", help="Question to answer")
+    parser.add_argument("--embed-workers", type=int, default=1, help="Worker processes for embedding during index build")
+    parser.add_argument("--embedding-backend", default="torch", choices=EMBEDDING_BACKENDS, help="Embedding model backend")
+    parser.add_argument("--validate-backend", metavar="BACKEND", choices=EMBEDDING_BACKENDS, help="Compare BACKEND against the torch embeddings on the policy corpus and exit")
+
+    parser.add_argument("--chunk-size", type=int, default=500, help="Words per chunk when building the index")
+    parser.add_argument("--chunk-overlap", type=int, default=100, help="Overlapping words between chunks")
+    parser.add_argument("--top-k", type=int, default=5, help="Chunks retrieved per question")
+    parser.add_argument("--use-existing-index", action="store_true", help="Answer against ./chroma_db without rebuilding it")
+    parser.add_argument("--deadline", type=float, default=30.0, help="End-to-end deadline per query in seconds (0 disables)")
+
+    gate = parser.add_argument_group("relevance gate")
+    gate.add_argument("--max-distance", type=float, help="Skip the LLM unless a chunk has cosine distance <= this")
+    gate.add_argument("--min-keyword-score", type=int, help="Skip the LLM unless a chunk has keyword overlap >= this")
+    gate.add_argument("--calibrate", metavar="FILE", help="Calibrate gate thresholds from labeled JSONL ('question', 'answerable') or 'log' for logs/queries.jsonl")
+    gate.add_argument("--target-recall", type=float, default=0.98, help="Minimum share of answerable questions the gate must let through")
+
+    snapshot = parser.add_argument_group("index snapshots")
+    snapshot.add_argument("--export-snapshot", metavar="FILE", help="Write the current index to a snapshot file and exit")
+    snapshot.add_argument("--import-snapshot", metavar="FILE", help="Replace the index with a snapshot file (no re-embedding) and exit")
+
+    sweep = parser.add_argument_group("retrieval parameter sweep")
+    sweep.add_argument("--sweep", metavar="FILE", help="Evaluate retrieval settings on labeled JSONL ('question', 'expected_sources') and exit")
+    sweep.add_argument("--sweep-output", metavar="FILE", default="logs/sweep_results.json", help="JSON file for sweep results")
+    sweep.add_argument("--sweep-chunk-sizes", type=int_list, default=[500], help="Comma-separated chunk sizes")
+    sweep.add_argument("--sweep-overlaps", type=int_list, default=[100], help="Comma-separated chunk overlaps")
+    sweep.add_argument("--sweep-top-ks", type=int_list, default=[5], help="Comma-separated top_k values")
+    sweep.add_argument("--sweep-hnsw-m", type=int_list, help="Comma-separated hnsw:M values")
+    sweep.add_argument("--sweep-construction-ef", type=int_list, help="Comma-separated hnsw:construction_ef values")
+    sweep.add_argument("--sweep-search-ef", type=int_list, help="Comma-separated hnsw:search_ef values")
+
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--batch", metavar="FILE", help="Answer questions from a TXT, JSONL or CSV file against the existing index")
+    batch.add_argument("--output", metavar="FILE", default="logs/batch_results.jsonl", help="JSONL results file (also the resume checkpoint)")
+    batch.add_argument("--prompt-type", default="improved", choices=["improved", "initial"])
+    batch.add_argument("--concurrency", type=int, default=4, help="Maximum requests in flight")
+    batch.add_argument("--rpm", type=float, default=30, help="Groq requests per minute limit")
+    batch.add_argument("--tpm", type=float, default=20000, help="Groq tokens per minute limit")
+    batch.add_argument("--tokens-per-request", type=int, default=1500, help="Estimated tokens per request")
+    batch.add_argument("--query-batching", action="store_true", help="Micro-batch concurrent query embeddings")
+    batch.add_argument("--max-retries", type=int, default=5, help="Retries on 429/5xx/connection errors")
+
+    return parser.parse_args()
+
+
+def open_existing_index(args) -> VectorStore:
+    """Open ./chroma_db as is, exiting if it has not been built yet."""
+    vector_store = VectorStore(embedding_backend=args.embedding_backend)
+    if vector_store.count() == 0:
+        print("Error: vector store is empty. Run `python main.py 'Your question'` once to build it.")
+        sys.exit(1)
+    return vector_store
+
+
+def run_batch_mode(args):
+    """Answer a file of questions against the existing vector store."""
+    questions = read_questions(args.batch)
+    print(f"Read {len(questions)} questions from {args.batch}")
+
+    vector_store = open_existing_index(args)
+    batcher = vector_store.enable_query_batching() if args.query_batching else None
+
+    rag_pipeline = RAGPipeline(
+        vector_store,
+        max_distance=args.max_distance,
+        min_keyword_score=args.min_keyword_score,
+        deadline_s=args.deadline or None
+    )
+
+    summary = run_batch(
+        rag_pipeline,
+        questions,
+        args.output,
+        prompt_type=args.prompt_type,
+        top_k=args.top_k,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        tokens_per_request=args.tokens_per_request,
+        max_retries=args.max_retries
+    )
+
+    print("\n" + "=" * 80)
+    print("BATCH SUMMARY:")
+    for k, v in summary.items():
+        print(f"{k}: {v}")
+    print(f"Results written to {args.output}")
+
+    if batcher:
+        print("\nQUERY EMBEDDING BATCHING:")
+        for k, v in batcher.metrics().items():
+            print(f"{k}: {v}")
+
+
+def run_validate_backend(args):
+    """Report agreement, latency and memory of an embedding backend vs torch."""
+    docs = load_documents()
+    if not docs:
+        print("No documents found in data/policies/")
+        sys.exit(1)
+
+    chunked = chunk_documents(docs, chunk_size=args.chunk_size, overlap=args.chunk_overlap)
+    texts = [chunk["text"] for chunk in chunked[:500]]
+
+    print(f"Validating '{args.validate_backend}' against 'torch' on {len(texts)} chunks...")
+    report = validate_backend(texts, args.validate_backend)
+
+    print("=" * 80)
+    agreement = report["cosine_agreement"]
+    print(f"Cosine agreement: mean={agreement['mean']:.5f} min={agreement['min']:.5f} p05={agreement['p05']:.5f}")
+    for name, stats in report["backends"].items():
+        print(
+            f"{name:<12} load={stats['load_time_s']}s rss=+{stats['rss_mb']}MB "
+            f"p50={stats['query_latency_p50_ms']}ms p95={stats['query_latency_p95_ms']}ms"
+        )
+    print("=" * 80)
+
+
+def run_calibration(args):
+    """Pick relevance gate thresholds from labeled questions or the query log."""
+    if args.calibrate == "log":
+        features = load_relevance_features_from_log()
+    else:
+        vector_store = open_existing_index(args)
+
+        with open(args.calibrate, "r", encoding="utf-8") as f:
+            labeled = [json.loads(line) for line in f if line.strip()]
+        features = collect_relevance_features(labeled, RAGPipeline(vector_store), top_k=args.top_k)
+
+    print(f"Calibrating on {len(features)} questions (target recall {args.target_recall})...")
+    result = calibrate_relevance_threshold(features, target_recall=args.target_recall)
+
+    print("=" * 80)
+    for k, v in result.items():
+        print(f"{k}: {v}")
+    print("=" * 80)
+
+
+def run_sweep(args):
+    """Evaluate chunking, top_k and HNSW settings on a labeled question set."""
+    docs = load_documents()
+    if not docs:
+        print("No documents found in data/policies/")
+        sys.exit(1)
+
+    labeled = load_retrieval_eval_set(args.sweep)
+    chunk_configs = [
+        (size, overlap)
+        for size in args.sweep_chunk_sizes
+        for overlap in args.sweep_overlaps
+        if overlap < size
+    ]
+    hnsw_configs = hnsw_grid(args.sweep_hnsw_m, args.sweep_construction_ef, args.sweep_search_ef)
+
+    print(
+        f"Sweeping {len(chunk_configs)} chunking x {len(hnsw_configs)} HNSW x "
+        f"{len(args.sweep_top_ks)} top_k settings on {len(labeled)} questions..."
+    )
+    results = sweep_retrieval_params(
+        docs,
+        labeled,
+        chunk_configs=chunk_configs,
+        top_ks=args.sweep_top_ks,
+        hnsw_configs=hnsw_configs,
+        embedding_backend=args.embedding_backend
+    )
+
+    print(format_results_table(results))
+
+    with open(args.sweep_output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.sweep_output}")
+
+
 def main():
     """CLI interface for RAG pipeline."""
     ensure_directories()
+    args = parse_args()
+
+    # ------------------------------------------------
+    # Embedding backend validation (no API key needed)
+    # ------------------------------------------------
+    if args.validate_backend:
+        run_validate_backend(args)
+        return
+
+    # ------------------------------------------------
+    # Index snapshots (no API key needed)
+    # ------------------------------------------------
+    if args.export_snapshot:
+        export_snapshot(open_existing_index(args), args.export_snapshot)
+        return
+
+    if args.import_snapshot:
+        import_snapshot(VectorStore(embedding_backend=args.embedding_backend), args.import_snapshot)
+        return
+
+    # ------------------------------------------------
+    # Retrieval parameter sweep (no API key needed)
+    # ------------------------------------------------
+    if args.sweep:
+        run_sweep(args)
+        return
 
     # ------------------------------------------------
     # Check API key
@@ -47,27 +274,55 @@ def main():
         print("Error: GROQ_API_KEY environment variable not set")
         sys.exit(1)
 
+    # ------------------------------------------------
+    # Relevance gate calibration
+    # ------------------------------------------------
+    if args.calibrate:
+        run_calibration(args)
+        return
+
+    # ------------------------------------------------
+    # Batch mode
+    # ------------------------------------------------
+    if args.batch:
+        run_batch_mode(args)
+        return
+
     # ------------------------------------------------
     # Get question from command line
     # ------------------------------------------------
-    if len(sys.argv) < 2:
+    if not args.question:
         print("Usage: python main.py 'Your question here'")
+        print("       python main.py --batch questions.jsonl --output results.jsonl")
         sys.exit(1)
 
-    question = " ".join(sys.argv[1:])
+    question = " ".join(args.question)
 
     # ------------------------------------------------
     # Setup RAG pipeline
     # ------------------------------------------------
-    vector_store = setup_vector_store()
-    rag_pipeline = RAGPipeline(vector_store)
+    if args.use_existing_index:
+        vector_store = open_existing_index(args)
+    else:
+        vector_store = setup_vector_store(
+            num_workers=args.embed_workers,
+            embedding_backend=args.embedding_backend,
+            chunk_size=args.chunk_size,
+            overlap=args.chunk_overlap
+        )
+    rag_pipeline = RAGPipeline(
+        vector_store,
+        max_distance=args.max_distance,
+        min_keyword_score=args.min_keyword_score,
+        deadline_s=args.deadline or None
+    )
 
     # ------------------------------------------------
     # Query
     # ------------------------------------------------
     print(f"\nQuestion: {question}\n")
 
-    response = rag_pipeline.query(question, prompt_type="improved")
+    response = rag_pipeline.query(question, prompt_type="improved", top_k=args.top_k)
 
     # ------------------------------------------------
     # Display Results
@@ -97,8 +352,17 @@ def main():
         print("\n" + "=" * 80)
         print("EVALUATION:")
         for k, v in response["evaluation"].items():
+            if k == "Evidence Matches":
+                continue
             print(f"{k}: {v}")
 
+        for i, match in enumerate(response["evaluation"].get("Evidence Matches", []), 1):
+            if match["match"]:
+                print(f"Evidence {i}: {match['match']} match in {match['source']} "
+                      f"(chunk {match['chunk'] + 1}, chars {match['start']}-{match['end']})")
+            else:
+                print(f"Evidence {i}: NOT FOUND in retrieved context")
+
     print("\n" + "=" * 80)
 
 
@@ -0,0 +1,294 @@
+import csv
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from groq import APIConnectionError, APIStatusError
+
+from src.deadline import StageTimeout
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Block until `amount` tokens are available, then take them.
+
+        Requests larger than the bucket capacity are clamped to the capacity
+        so they can still proceed.
+
+        Returns:
+            False if `stop_event` was set while waiting, True otherwise
+        """
+        amount = min(amount, self.capacity)
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+
+                wait = (amount - self.tokens) / self.rate
+
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+def question_text_id(question: str) -> str:
+    """Stable id for a question without one: a short hash of its text."""
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()[:16]
+
+
+def read_questions(path: str) -> List[Dict]:
+    """
+    Read batch questions from a TXT, JSONL or CSV file.
+
+    - TXT: one question per line (blank lines and lines starting with '#' are skipped)
+    - JSONL: objects with a 'question' key and an optional 'id'
+    - CSV: a 'question' column and an optional 'id' column
+
+    Returns:
+        List of dicts with 'id' and 'question' keys. Missing ids default to
+        a hash of the question text, so checkpoints stay valid when the file
+        is edited; repeated questions without an explicit id are read once.
+    """
+    file_path = Path(path)
+    suffix = file_path.suffix.lower()
+    questions = []
+
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        if suffix == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        elif suffix == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [
+                {"question": line.strip()}
+                for line in f
+                if line.strip() and not line.strip().startswith("#")
+            ]
+
+    seen_ids = set()
+    for row in rows:
+        question = (row.get("question") or "").strip()
+        if not question:
+            continue
+        question_id = row.get("id")
+        if question_id in (None, ""):
+            question_id = question_text_id(question)
+            if question_id in seen_ids:
+                continue
+        seen_ids.add(str(question_id))
+        questions.append({"id": str(question_id), "question": question})
+
+    return questions
+
+
+def load_completed_ids(output_path: str) -> Set[str]:
+    """Return ids of questions already answered successfully in a results file."""
+    completed = set()
+    if not Path(output_path).exists():
+        return completed
+
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partially written last line from an interrupted run
+                continue
+            if "error" not in record:
+                completed.add(str(record.get("id")))
+
+    return completed
+
+
+def compact_results(output_path: str) -> None:
+    """
+    Rewrite a results file with one record per question id.
+
+    The last record for an id wins (a later answer replaces an earlier
+    error), records keep the position where their id first appeared, and
+    partially written lines are dropped.
+    """
+    records: Dict[str, Dict] = {}
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[str(record.get("id"))] = record
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output_path)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and connection problems are worth retrying."""
+    if isinstance(error, (APIConnectionError, StageTimeout)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _retry_delay(error: Exception, attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter, honouring a Retry-After header if present."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(max_delay, float(retry_after))
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def run_batch(
+    rag_pipeline,
+    questions: List[Dict],
+    output_path: str,
+    prompt_type: str = "improved",
+    top_k: int = 5,
+    concurrency: int = 4,
+    requests_per_minute: float = 30,
+    tokens_per_minute: float = 20000,
+    tokens_per_request: int = 1500,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0
+) -> Dict:
+    """
+    Answer a list of questions and append JSONL results to `output_path`.
+
+    The results file doubles as the checkpoint: questions already answered
+    successfully are skipped, so an interrupted run resumes where it stopped.
+    Failed questions are recorded with an 'error' key and retried on the
+    next run. Records are appended while the run is in progress and the
+    file is compacted when it ends (see `compact_results`), so it holds
+    exactly one record per question: the latest answer or error.
+
+    Requests are paced by request- and token-per-minute buckets (token cost
+    is estimated up front as `tokens_per_request`), limited to `concurrency`
+    in flight, and retried with exponential backoff and jitter on 429/5xx
+    and connection errors.
+
+    Returns:
+        Summary dict with counts of answered, failed and skipped questions
+    """
+    completed = load_completed_ids(output_path)
+    pending = [q for q in questions if q["id"] not in completed]
+
+    summary = {
+        "total": len(questions),
+        "skipped": len(questions) - len(pending),
+        "answered": 0,
+        "failed": 0
+    }
+
+    if not pending:
+        return summary
+
+    # Retries are handled here, not by the client
+    rag_pipeline.client = rag_pipeline.client.with_options(max_retries=0)
+
+    request_bucket = TokenBucket(requests_per_minute, capacity=max(1, concurrency))
+    token_bucket = TokenBucket(tokens_per_minute)
+    write_lock = threading.Lock()
+    stop_event = threading.Event()
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    out = open(output_path, "a", encoding="utf-8")
+
+    def write_record(record: Dict):
+        with write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    def answer(item: Dict) -> bool:
+        record = {"id": item["id"], "question": item["question"]}
+
+        for attempt in range(max_retries + 1):
+            if not request_bucket.acquire(1, stop_event) or not token_bucket.acquire(tokens_per_request, stop_event):
+                return False
+
+            start = time.time()
+            try:
+                response = rag_pipeline.query(
+                    item["question"], prompt_type=prompt_type, top_k=top_k, raise_errors=True
+                )
+            except Exception as e:
+                if attempt < max_retries and _is_retryable(e):
+                    if stop_event.wait(_retry_delay(e, attempt, base_delay, max_delay)):
+                        return False
+                    continue
+
+                record["error"] = f"{type(e).__name__}: {e}"
+                write_record(record)
+                return False
+
+            record.update({
+                "answer": response["answer"],
+                "evidence": response.get("evidence", []),
+                "confidence": response.get("confidence", "N/A"),
+                "sources": [
+                    {
+                        "source": chunk.get("metadata", {}).get("source", "Unknown"),
+                        "score": chunk.get("score", 0)
+                    }
+                    for chunk in response.get("retrieved_chunks", [])
+                ],
+                "evaluation": response.get("evaluation", {}),
+                "degraded": response.get("degraded"),
+                "latency_s": round(time.time() - start, 3)
+            })
+            write_record(record)
+            return True
+
+        return False
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = [executor.submit(answer, item) for item in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            if future.result():
+                summary["answered"] += 1
+            else:
+                summary["failed"] += 1
+            print(f"[{done}/{len(pending)}] answered={summary['answered']} failed={summary['failed']}")
+    except KeyboardInterrupt:
+        print("Interrupted, stopping after in-flight requests. Re-run to resume.")
+        stop_event.set()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        out.close()
+        compact_results(output_path)
+
+    return summary
@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import Executor, Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional
+
+
+# Per-stage time budgets in seconds; each stage also gets at most the
+# time left on the overall query deadline.
+DEFAULT_STAGE_BUDGETS = {
+    "embed": 5.0,
+    "search": 5.0,
+    "rerank": 1.0,
+    "llm": 25.0
+}
+
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage exceeds its budget."""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Stage '{stage}' exceeded its {budget:.2f}s budget")
+        self.stage = stage
+        self.budget = budget
+
+
+class Deadline:
+    """End-to-end query deadline split into per-stage budgets."""
+
+    def __init__(
+        self,
+        total_s: Optional[float],
+        stage_budgets: Optional[Dict[str, float]] = None,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Args:
+            total_s: Overall deadline in seconds (None disables all timeouts)
+            stage_budgets: Per-stage budgets, defaults to DEFAULT_STAGE_BUDGETS
+            executor: Executor used to run stages with a timeout
+        """
+        self.total_s = total_s
+        self.stage_budgets = {**DEFAULT_STAGE_BUDGETS, **(stage_budgets or {})}
+        self.executor = executor
+        self.start = time.monotonic()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left on the overall deadline, or None if unbounded."""
+        if self.total_s is None:
+            return None
+        return self.total_s - (time.monotonic() - self.start)
+
+    def budget(self, stage: str) -> Optional[float]:
+        """Time allowed for `stage`: its own budget capped by the time left."""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return min(self.stage_budgets.get(stage, remaining), remaining)
+
+    def run(self, stage: str, fn: Callable, *args, **kwargs):
+        """
+        Run `fn` within the stage budget.
+
+        The caller stops waiting when the budget runs out; a stage that is
+        already running cannot be interrupted and finishes in the background.
+
+        Raises:
+            StageTimeout: if the budget is exhausted before or during the call
+        """
+        budget = self.budget(stage)
+        if budget is None or self.executor is None:
+            return fn(*args, **kwargs)
+        if budget <= 0:
+            raise StageTimeout(stage, 0.0)
+
+        return self.wait(stage, self.executor.submit(fn, *args, **kwargs))
+
+    def wait(self, stage: str, future: Future):
+        """
+        Wait for an already-submitted `future` within the stage budget,
+        cancelling it on timeout.
+
+        Raises:
+            StageTimeout: if the budget is exhausted before or during the wait
+        """
+        budget = self.budget(stage)
+        if budget is not None and budget <= 0:
+            future.cancel()
+            raise StageTimeout(stage, 0.0)
+
+        try:
+            return future.result(timeout=budget)
+        except FutureTimeoutError:
+            future.cancel()
+            raise StageTimeout(stage, budget)
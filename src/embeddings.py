@@ -0,0 +1,423 @@
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# "torch": full-precision PyTorch (reference)
+# "torch-int8": PyTorch with dynamic int8 quantization of Linear layers
+# "onnx": ONNX Runtime export of the same model
+# "onnx-int8": ONNX Runtime, dynamically int8-quantized export
+EMBEDDING_BACKENDS = ["torch", "torch-int8", "onnx", "onnx-int8"]
+
+# Quantized export shipped in the all-MiniLM-L6-v2 model repository
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+# Per-process model used by embedding pool workers
+_worker_model = None
+
+
+def load_embedding_model(model_name: str = DEFAULT_MODEL_NAME, backend: str = "torch"):
+    """
+    Load a SentenceTransformer for one of EMBEDDING_BACKENDS.
+
+    The quantized and ONNX backends run on CPU. The ONNX backends need sentence-transformers >= 3.2 with
+    optimum[onnxruntime] installed.
+    """
+    # Imported lazily so pool workers can set thread env vars first
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    if backend == "torch-int8":
+        import torch
+
+        model = SentenceTransformer(model_name, device="cpu")
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    if backend.startswith("onnx"):
+        _require_onnx_runtime(backend)
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx")
+
+    if backend == "onnx-int8":
+        return SentenceTransformer(
+            model_name,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": ONNX_INT8_FILE}
+        )
+
+    raise ValueError(f"Unknown embedding backend: {backend}. Choose from {EMBEDDING_BACKENDS}")
+
+
+def _require_onnx_runtime(backend: str):
+    """Fail with an install hint if the ONNX backends' optional dependency is missing."""
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            f"The '{backend}' embedding backend needs optimum with onnxruntime: "
+            f"pip install 'optimum[onnxruntime]'"
+        ) from e
+
+
+def _init_worker(model_name: str, backend: str, num_threads: int):
+    """Load one model copy per worker with a fixed thread budget."""
+    global _worker_model
+
+    # Must be set before torch is imported to take effect
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["MKL_NUM_THREADS"] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _worker_model = load_embedding_model(model_name, backend)
+
+
+def _encode_shard(indices: List[int], texts: List[str], batch_size: int) -> Tuple[List[int], np.ndarray]:
+    """Encode one shard in a worker; indices are returned for reassembly."""
+    embeddings = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return indices, embeddings.astype(np.float32)
+
+
+def encode_parallel(
+    texts: List[str],
+    model_name: str = DEFAULT_MODEL_NAME,
+    backend: str = "torch",
+    num_workers: Optional[int] = None,
+    batch_size: int = 32,
+    batches_per_shard: int = 4
+) -> np.ndarray:
+    """
+    Encode texts across a pool of CPU worker processes.
+
+    Texts are sorted by length so each batch holds similarly sized inputs
+    (less padding), cut into shards of `batches_per_shard` batches, and
+    encoded by workers that each hold their own model copy and an equal
+    share of the CPU threads. Results are returned in the input order.
+
+    Args:
+        texts: Texts to encode
+        model_name: SentenceTransformer model to load in each worker
+        backend: Embedding backend to load in each worker
+        num_workers: Worker processes (default: CPU count)
+        batch_size: Encode batch size inside each worker
+        batches_per_shard: Batches handed to a worker per task
+
+    Returns:
+        float32 array of shape (len(texts), embedding_dim)
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    cpu_count = os.cpu_count() or 1
+    num_workers = max(1, min(num_workers or cpu_count, len(texts)))
+    num_threads = max(1, cpu_count // num_workers)
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    shard_size = batch_size * batches_per_shard
+    shards = [order[i:i + shard_size] for i in range(0, len(order), shard_size)]
+
+    embeddings = None
+
+    # spawn: workers must not inherit an already-initialised torch thread pool
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_name, backend, num_threads)
+    ) as executor:
+        futures = [
+            executor.submit(_encode_shard, shard, [texts[i] for i in shard], batch_size)
+            for shard in shards
+        ]
+
+        for future in futures:
+            indices, shard_embeddings = future.result()
+            if embeddings is None:
+                embeddings = np.empty((len(texts), shard_embeddings.shape[1]), dtype=np.float32)
+            embeddings[indices] = shard_embeddings
+
+    return embeddings
+
+
+def _current_rss_mb() -> float:
+    """Resident set size of this process in MB (peak RSS if /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        # Windows: neither /proc nor getrusage
+        return float("nan")
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def _import_backend_libraries(backend: str):
+    """Import everything a backend needs so RSS deltas exclude library import cost."""
+    import sentence_transformers  # noqa: F401
+    import torch  # noqa: F401
+
+    if backend.startswith("onnx"):
+        _require_onnx_runtime(backend)
+
+
+def _profile_backend(model_name: str, backend: str, texts: List[str], queries: List[str]) -> Dict:
+    """Load a backend in a fresh process and measure footprint and query latency."""
+    _import_backend_libraries(backend)
+
+    rss_before = _current_rss_mb()
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    load_time = time.perf_counter() - start
+    rss_after = _current_rss_mb()
+
+    embeddings = model.encode(texts, convert_to_numpy=True).astype(np.float32)
+
+    # Warm up, then time single-query encodes as done by VectorStore.search
+    model.encode([queries[0]])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "embeddings": embeddings,
+        "load_time_s": load_time,
+        "rss_mb": rss_after - rss_before,
+        "latencies_ms": latencies
+    }
+
+
+def validate_backend(
+    texts: List[str],
+    backend: str,
+    reference_backend: str = "torch",
+    model_name: str = DEFAULT_MODEL_NAME,
+    num_queries: int = 100
+) -> Dict:
+    """
+    Compare an embedding backend against the reference backend.
+
+    Each backend is loaded in its own fresh process, after its libraries are
+    imported, so "rss_mb" is the model footprint alone.
+
+    Args:
+        texts: Sample texts (e.g. document chunks) to embed with both backends
+        backend: Candidate backend
+        reference_backend: Backend to compare against
+        model_name: SentenceTransformer model name
+        num_queries: Number of single-text encodes used for latency
+
+    Returns:
+        Dict with cosine agreement stats and per-backend latency/RSS figures
+    """
+    if not texts:
+        raise ValueError("validate_backend needs at least one text")
+
+    queries = [texts[i % len(texts)] for i in range(num_queries)]
+
+    profiles = {}
+    for name in [reference_backend, backend]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as executor:
+            profiles[name] = executor.submit(_profile_backend, model_name, name, texts, queries).result()
+
+    reference = profiles[reference_backend]["embeddings"]
+    candidate = profiles[backend]["embeddings"]
+    cosine = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+
+    report = {
+        "model": model_name,
+        "num_texts": len(texts),
+        "cosine_agreement": {
+            "mean": float(np.mean(cosine)),
+            "min": float(np.min(cosine)),
+            "p05": float(np.percentile(cosine, 5))
+        },
+        "backends": {}
+    }
+
+    for name, profile in profiles.items():
+        report["backends"][name] = {
+            "load_time_s": round(profile["load_time_s"], 2),
+            "rss_mb": round(profile["rss_mb"], 1),
+            "query_latency_p50_ms": round(float(np.percentile(profile["latencies_ms"], 50)), 2),
+            "query_latency_p95_ms": round(float(np.percentile(profile["latencies_ms"], 95)), 2)
+        }
+
+    return report
+
+
+class QueryEmbeddingBatcher:
+    """
+    Dynamic micro-batching of concurrent single-query encodes.
+
+    Callers submit one query each and get a future; a background thread
+    collects requests until `max_batch_size` is reached or the first
+    request has waited `max_wait_ms`, then runs one `encode` for the whole
+    batch and resolves every caller's future.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue: queue.Queue = queue.Queue()
+
+        self.metrics_lock = threading.Lock()
+        self.batch_sizes: Counter = Counter()
+        self.queue_delays_ms: deque = deque(maxlen=10000)
+        self.encode_times_ms: deque = deque(maxlen=10000)
+
+        self.thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, query: str) -> Future:
+        """Queue a query; the future resolves to its embedding as a list of floats."""
+        future: Future = Future()
+        self.queue.put((query, future, time.monotonic()))
+        return future
+
+    def encode(self, query: str, timeout: Optional[float] = None) -> List[float]:
+        """
+        Embed one query, blocking until its batch has been encoded.
+
+        On timeout the request is cancelled, so it is dropped from its batch
+        if encoding has not started yet.
+
+        Raises:
+            TimeoutError: if the embedding is not ready within `timeout` seconds
+        """
+        future = self.submit(query)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        """Stop the background thread after pending requests are served."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            flush_at = item[2] + self.max_wait
+            stop = False
+
+            while len(batch) < self.max_batch_size:
+                remaining = flush_at - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._encode_batch(batch)
+            if stop:
+                return
+
+    def _encode_batch(self, batch: List[Tuple[str, Future, float]]):
+        # Skip requests whose callers already gave up
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        start = time.monotonic()
+        try:
+            embeddings = self.model.encode([query for query, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        end = time.monotonic()
+
+        for (_, future, _), embedding in zip(batch, embeddings):
+            future.set_result(embedding.tolist())
+
+        with self.metrics_lock:
+            self.batch_sizes[len(batch)] += 1
+            self.encode_times_ms.append((end - start) * 1000)
+            self.queue_delays_ms.extend((start - enqueued) * 1000 for _, _, enqueued in batch)
+
+    def metrics(self) -> Dict:
+        """Batch size distribution, queueing delay and encode time statistics."""
+        with self.metrics_lock:
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+            delays = list(self.queue_delays_ms)
+            encode_times = list(self.encode_times_ms)
+
+        num_batches = sum(batch_sizes.values())
+        num_requests = sum(size * count for size, count in batch_sizes.items())
+
+        return {
+            "batches": num_batches,
+            "requests": num_requests,
+            "mean_batch_size": round(num_requests / num_batches, 2) if num_batches else 0.0,
+            "batch_size_histogram": batch_sizes,
+            "queue_delay_p50_ms": round(float(np.percentile(delays, 50)), 2) if delays else 0.0,
+            "queue_delay_p95_ms": round(float(np.percentile(delays, 95)), 2) if delays else 0.0,
+            "encode_time_mean_ms": round(float(np.mean(encode_times)), 2) if encode_times else 0.0
+        }
+
+
+# One batcher per (model, backend) per process, so every VectorStore in a
+# multi-session server (e.g. Streamlit) feeds the same micro-batches
+_shared_batchers: Dict[Tuple[str, str], QueryEmbeddingBatcher] = {}
+_shared_batchers_lock = threading.Lock()
+
+
+def shared_query_batcher(
+    model_name: str,
+    backend: str,
+    model_loader: Callable,
+    max_batch_size: int = 32,
+    max_wait_ms: float = 5.0
+) -> QueryEmbeddingBatcher:
+    """
+    Return the process-wide batcher for a model/backend, creating it once.
+
+    `model_loader` is only called when the batcher does not exist yet.
+    Batch settings of later callers are ignored.
+    """
+    key = (model_name, backend)
+    with _shared_batchers_lock:
+        if key not in _shared_batchers:
+            _shared_batchers[key] = QueryEmbeddingBatcher(model_loader(), max_batch_size, max_wait_ms)
+        return _shared_batchers[key]
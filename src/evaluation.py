@@ -1,6 +1,12 @@
+import itertools
 import json
+import shutil
+import tempfile
+import time
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
 
 
 def load_queries_log(log_file: str = "logs/queries.jsonl") -> List[Dict]:
@@ -33,12 +39,315 @@ def analyze_confidence_distribution(log_file: str = "logs/queries.jsonl") -> Dic
 
 
 def compare_prompts(question: str, rag_pipeline) -> Dict:
-    """Compare initial vs improved prompt responses."""
-    initial_response = rag_pipeline.query(question, prompt_type="initial")
-    improved_response = rag_pipeline.query(question, prompt_type="improved")
+    """Compare initial vs improved prompt responses (shared retrieval, concurrent LLM calls)."""
+    responses = rag_pipeline.query_variants(question, prompt_types=["initial", "improved"])
     
     return {
         "question": question,
-        "initial": initial_response,
-        "improved": improved_response
-    }
\ No newline at end of file
+        "initial": responses["initial"],
+        "improved": responses["improved"]
+    }
+
+# ============================================================
+# Relevance gate calibration
+# ============================================================
+
+def collect_relevance_features(labeled_questions: List[Dict], rag_pipeline, top_k: int = 5) -> List[Dict]:
+    """
+    Retrieve chunks for labeled questions and record their best scores.
+    
+    Args:
+        labeled_questions: Dicts with 'question' and boolean 'answerable' keys
+        rag_pipeline: RAGPipeline whose vector store and reranker are used
+    
+    Returns:
+        List of dicts with 'best_distance', 'best_keyword_score' and 'answerable'
+    """
+    features = []
+    
+    for item in labeled_questions:
+        chunks = rag_pipeline.vector_store.search(item["question"], top_k=top_k)
+        if not chunks:
+            continue
+        chunks = rag_pipeline.rerank_simple(chunks, item["question"])
+        
+        features.append({
+            "best_distance": min(chunk.get("score", 0) for chunk in chunks),
+            "best_keyword_score": max(chunk.get("keyword_score", 0) for chunk in chunks),
+            "answerable": bool(item["answerable"])
+        })
+    
+    return features
+
+
+def load_relevance_features_from_log(log_file: str = "logs/queries.jsonl") -> List[Dict]:
+    """
+    Derive relevance features from the query log.
+    
+    Only improved-prompt queries that reached the LLM are used; a question
+    counts as answerable unless the model answered "I don't know".
+    """
+    features = []
+    
+    for entry in load_queries_log(log_file):
+        response = entry.get("response", {})
+        chunks = [chunk for chunk in entry.get("chunks", []) if chunk.get("score") is not None]
+        
+        if entry.get("prompt_type") != "improved" or response.get("gated") or not chunks:
+            continue
+        
+        answer = response.get("answer", "")
+        features.append({
+            "best_distance": min(chunk["score"] for chunk in chunks),
+            "best_keyword_score": max(chunk.get("keyword_score") or 0 for chunk in chunks),
+            "answerable": not (isinstance(answer, str) and answer.startswith("I don't know"))
+        })
+    
+    return features
+
+
+def calibrate_relevance_threshold(features: List[Dict], target_recall: float = 0.98) -> Dict:
+    """
+    Pick relevance gate thresholds from labeled features.
+    
+    Searches max_distance over the observed best distances and
+    min_keyword_score over the observed keyword scores (or disabled), and
+    returns the combination that rejects the most unanswerable questions
+    while still letting through at least `target_recall` of answerable ones.
+    
+    Returns:
+        Dict with 'max_distance', 'min_keyword_score', 'recall',
+        'rejection_rate' and sample counts
+    """
+    answerable = [f for f in features if f["answerable"]]
+    unanswerable = [f for f in features if not f["answerable"]]
+    
+    if not answerable:
+        raise ValueError("Calibration needs at least one answerable question")
+    
+    distances = sorted({f["best_distance"] for f in features})
+    keyword_scores = [None] + sorted({f["best_keyword_score"] for f in features if f["best_keyword_score"] > 0})
+    
+    def passes(f, max_distance, min_keyword_score):
+        if f["best_distance"] <= max_distance:
+            return True
+        return min_keyword_score is not None and f["best_keyword_score"] >= min_keyword_score
+    
+    best = None
+    for min_keyword_score in keyword_scores:
+        for max_distance in distances:
+            recall = sum(passes(f, max_distance, min_keyword_score) for f in answerable) / len(answerable)
+            if recall < target_recall:
+                continue
+            
+            rejected = sum(not passes(f, max_distance, min_keyword_score) for f in unanswerable)
+            rejection_rate = rejected / len(unanswerable) if unanswerable else 0.0
+            
+            # Prefer higher rejection, then higher recall, then the simpler distance-only gate
+            key = (rejection_rate, recall, min_keyword_score is None)
+            if best is None or key > best[0]:
+                best = (key, max_distance, min_keyword_score, recall, rejection_rate)
+            # Larger distances only lower rejection for this keyword setting
+            break
+    
+    _, max_distance, min_keyword_score, recall, rejection_rate = best
+    
+    return {
+        "max_distance": max_distance,
+        "min_keyword_score": min_keyword_score,
+        "recall": recall,
+        "rejection_rate": rejection_rate,
+        "num_answerable": len(answerable),
+        "num_unanswerable": len(unanswerable)
+    }
+
+
+# ============================================================
+# Retrieval parameter sweep
+# ============================================================
+
+def load_retrieval_eval_set(path: str) -> List[Dict]:
+    """
+    Load labeled retrieval questions from JSONL.
+    
+    Each line has 'question' and 'expected_sources' (list of source file
+    names) or a single 'expected_source'.
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            expected = row.get("expected_sources") or [row["expected_source"]]
+            items.append({"question": row["question"], "expected_sources": set(expected)})
+    
+    return items
+
+
+def retrieval_metrics(retrieved_sources: List[List[str]], expected_sources: List[set]) -> Dict:
+    """
+    Source-level recall@k and MRR.
+    
+    recall@k is the share of expected sources found among the retrieved
+    chunks; MRR uses the rank of the first chunk from an expected source.
+    """
+    recalls = []
+    reciprocal_ranks = []
+    
+    for retrieved, expected in zip(retrieved_sources, expected_sources):
+        recalls.append(len(expected & set(retrieved)) / len(expected))
+        rank = next((i for i, source in enumerate(retrieved, 1) if source in expected), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    
+    return {
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+        "mrr": float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0
+    }
+
+
+def _directory_size_mb(path: str) -> float:
+    """Total size of files under `path` in MB."""
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / (1024 * 1024)
+
+
+def hnsw_grid(
+    m_values: Optional[List[int]] = None,
+    construction_ef_values: Optional[List[int]] = None,
+    search_ef_values: Optional[List[int]] = None
+) -> List[Dict]:
+    """Cartesian product of HNSW settings; omitted lists keep Chroma's defaults."""
+    axes = [
+        ("hnsw:M", m_values),
+        ("hnsw:construction_ef", construction_ef_values),
+        ("hnsw:search_ef", search_ef_values)
+    ]
+    axes = [(key, values) for key, values in axes if values]
+    
+    return [
+        dict(zip([key for key, _ in axes], combo))
+        for combo in itertools.product(*[values for _, values in axes])
+    ]
+
+
+def sweep_retrieval_params(
+    documents: List[Dict],
+    labeled_questions: List[Dict],
+    chunk_configs: Optional[List[Tuple[int, int]]] = None,
+    top_ks: Optional[List[int]] = None,
+    hnsw_configs: Optional[List[Dict]] = None,
+    embedding_backend: str = "torch"
+) -> List[Dict]:
+    """
+    Measure retrieval quality and cost over a grid of settings.
+    
+    For every (chunk_size, overlap) the corpus is chunked and embedded once;
+    for every HNSW config a fresh index is built in a temporary directory
+    from those embeddings; every top_k is then evaluated against it.
+    Question embeddings are computed once and each index gets one untimed
+    warm-up query, so query latency covers the steady-state vector search
+    alone.
+    
+    Args:
+        documents: Loaded documents (see src.loader.load_documents)
+        labeled_questions: Output of load_retrieval_eval_set
+        chunk_configs: (chunk_size, overlap) pairs
+        top_ks: Values of top_k to evaluate
+        hnsw_configs: Collection HNSW settings (default: Chroma's defaults)
+        embedding_backend: Embedding backend used for chunks and questions
+    
+    Returns:
+        One dict per configuration with recall@k, MRR, index size, build
+        times and query latency percentiles
+    """
+    # Imported here to keep the log-analysis helpers free of model dependencies
+    from src.chunking import chunk_documents
+    from src.embeddings import DEFAULT_MODEL_NAME, load_embedding_model
+    from src.vectorstore import VectorStore
+    
+    chunk_configs = chunk_configs or [(500, 100)]
+    top_ks = top_ks or [5]
+    hnsw_configs = hnsw_configs or [{}]
+    model = load_embedding_model(DEFAULT_MODEL_NAME, embedding_backend)
+    
+    question_embeddings = model.encode([item["question"] for item in labeled_questions]).tolist()
+    expected_sources = [item["expected_sources"] for item in labeled_questions]
+    
+    results = []
+    
+    for chunk_size, overlap in chunk_configs:
+        chunked = chunk_documents(documents, chunk_size=chunk_size, overlap=overlap)
+        
+        start = time.perf_counter()
+        embeddings = model.encode([chunk["text"] for chunk in chunked])
+        embed_time = time.perf_counter() - start
+        
+        for hnsw_params in hnsw_configs:
+            persist_directory = tempfile.mkdtemp(prefix="rag_sweep_")
+            try:
+                vector_store = VectorStore(
+                    collection_name="sweep",
+                    persist_directory=persist_directory,
+                    embedding_backend=embedding_backend,
+                    hnsw_params=hnsw_params,
+                    embedding_model=model
+                )
+                
+                start = time.perf_counter()
+                vector_store.add_documents(chunked, embeddings=embeddings)
+                build_time = time.perf_counter() - start
+                index_size = _directory_size_mb(persist_directory)
+                
+                # Untimed warm-up so the first timed query doesn't pay for
+                # loading the index into memory
+                if question_embeddings:
+                    vector_store.search_by_embedding(question_embeddings[0], top_k=max(top_ks))
+                
+                for top_k in top_ks:
+                    latencies = []
+                    retrieved_sources = []
+                    
+                    for query_embedding in question_embeddings:
+                        start = time.perf_counter()
+                        chunks = vector_store.search_by_embedding(query_embedding, top_k=top_k)
+                        latencies.append((time.perf_counter() - start) * 1000)
+                        retrieved_sources.append(
+                            [chunk.get("metadata", {}).get("source") for chunk in chunks]
+                        )
+                    
+                    metrics = retrieval_metrics(retrieved_sources, expected_sources)
+                    
+                    results.append({
+                        "chunk_size": chunk_size,
+                        "overlap": overlap,
+                        "num_chunks": len(chunked),
+                        **hnsw_params,
+                        "top_k": top_k,
+                        "recall@k": round(metrics["recall"], 4),
+                        "mrr": round(metrics["mrr"], 4),
+                        "index_size_mb": round(index_size, 2),
+                        "embed_time_s": round(embed_time, 2),
+                        "build_time_s": round(build_time, 2),
+                        "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                        "query_p95_ms": round(float(np.percentile(latencies, 95)), 2)
+                    })
+            finally:
+                shutil.rmtree(persist_directory, ignore_errors=True)
+    
+    return results
+
+
+def format_results_table(rows: List[Dict]) -> str:
+    """Render a list of flat dicts as a fixed-width text table."""
+    if not rows:
+        return ""
+    
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    widths = {c: max(len(c), *(len(str(row.get(c, ""))) for row in rows)) for c in columns}
+    
+    lines = ["  ".join(c.ljust(widths[c]) for c in columns)]
+    lines.append("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        lines.append("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+    
+    return "\n".join(lines)
@@ -1,9 +1,16 @@
+import io
+import multiprocessing as mp
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from typing import BinaryIO, Callable, List, Optional, Tuple, Union
 import PyPDF2
 
 
+# A document source: a path on disk, raw bytes, or a binary file-like object
+Source = Union[str, Path, bytes, BinaryIO]
+
+
 def load_documents(directory: str = "data/policies") -> List[dict]:
     """
     Load all documents from the policies directory.
@@ -22,21 +29,9 @@ def load_documents(directory: str = "data/policies") -> List[dict]:
     for file_path in policy_dir.iterdir():
         if file_path.is_file():
             try:
-                if file_path.suffix.lower() == ".pdf":
-                    text = load_pdf(file_path)
-                elif file_path.suffix.lower() in [".txt", ".md"]:
-                    text = load_text(file_path)
-                else:
-                    continue
-                
-                if text.strip():
-                    documents.append({
-                        "text": text,
-                        "metadata": {
-                            "source": file_path.name,
-                            "type": file_path.suffix[1:]
-                        }
-                    })
+                doc = load_file(file_path.name, file_path)
+                if doc:
+                    documents.append(doc)
                     print(f"Loaded: {file_path.name}")
             except Exception as e:
                 print(f"Error loading {file_path.name}: {e}")
@@ -44,17 +39,124 @@ def load_documents(directory: str = "data/policies") -> List[dict]:
     return documents
 
 
-def load_pdf(file_path: Path) -> str:
-    """Extract text from PDF file."""
+def load_file(name: str, source: Source) -> Optional[dict]:
+    """
+    Extract a single document, dispatching on the extension of `name`.
+    
+    Returns:
+        Dict with 'text' and 'metadata' keys, or None if the file type is
+        unsupported or the file contains no text
+    """
+    suffix = Path(name).suffix.lower()
+    
+    if suffix == ".pdf":
+        text = load_pdf(source)
+    elif suffix in [".txt", ".md"]:
+        text = load_text(source)
+    else:
+        return None
+    
+    if not text.strip():
+        return None
+    
+    return {
+        "text": text,
+        "metadata": {
+            "source": name,
+            "type": suffix[1:]
+        }
+    }
+
+
+def load_buffers(
+    files: List[Tuple[str, bytes]],
+    max_workers: Optional[int] = None,
+    progress_callback: Optional[Callable[[int, int, str, Optional[str]], None]] = None
+) -> Tuple[List[dict], List[Tuple[str, str]]]:
+    """
+    Extract text from in-memory files in parallel.
+    
+    PDF parsing is CPU-bound pure Python, so files are spread across worker
+    processes (a single file is parsed in-process). A failure in one file
+    does not affect the others.
+    
+    Args:
+        files: List of (file name, file bytes)
+        max_workers: Number of worker processes (default: CPU count)
+        progress_callback: Called as (done, total, name, error) after each file
+    
+    Returns:
+        Tuple of (documents in input order, list of (file name, error message))
+    """
+    if not files:
+        return [], []
+    
+    max_workers = min(max_workers or os.cpu_count() or 1, len(files))
+    results: List[Optional[dict]] = [None] * len(files)
+    errors = []
+    
+    def collect(done, i, name, extract):
+        error = None
+        try:
+            results[i] = extract()
+        except Exception as e:
+            error = str(e)
+            errors.append((name, error))
+        
+        if progress_callback:
+            progress_callback(done, len(files), name, error)
+    
+    if max_workers == 1:
+        for i, (name, data) in enumerate(files):
+            collect(i + 1, i, name, lambda: load_file(name, data))
+        return [doc for doc in results if doc], errors
+    
+    # spawn: the caller (e.g. the Streamlit server) is multithreaded and may
+    # hold torch state, which is not safe to fork
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn")) as executor:
+        futures = {
+            executor.submit(load_file, name, data): (i, name)
+            for i, (name, data) in enumerate(files)
+        }
+        
+        for done, future in enumerate(as_completed(futures), 1):
+            i, name = futures[future]
+            collect(done, i, name, future.result)
+    
+    documents = [doc for doc in results if doc]
+    return documents, errors
+
+
+def _open_binary(source: Source) -> BinaryIO:
+    """Return a binary stream for a path, bytes, or file-like source."""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    if isinstance(source, (str, Path)):
+        return open(source, "rb")
+    return source
+
+
+def load_pdf(source: Source) -> str:
+    """Extract text from a PDF path, byte buffer, or binary file-like object."""
     text = []
-    with open(file_path, "rb") as f:
-        reader = PyPDF2.PdfReader(f)
+    stream = _open_binary(source)
+    try:
+        reader = PyPDF2.PdfReader(stream)
         for page in reader.pages:
             text.append(page.extract_text())
+    finally:
+        if isinstance(source, (str, Path)):
+            stream.close()
     return "\n".join(text)
 
 
-def load_text(file_path: Path) -> str:
-    """Load text from TXT or MD file."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
\ No newline at end of file
+def load_text(source: Source) -> str:
+    """Load text from a TXT or MD path, byte buffer, or file-like object."""
+    if isinstance(source, (str, Path)):
+        with open(source, "r", encoding="utf-8") as f:
+            return f.read()
+    
+    data = source if isinstance(source, (bytes, bytearray)) else source.read()
+    if isinstance(data, str):
+        return data
+    return bytes(data).decode("utf-8")
@@ -1,84 +1,402 @@
-from groq import Groq
-from typing import List, Dict
+from groq import Groq, APIConnectionError, APIStatusError, APITimeoutError
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from src.vectorstore import VectorStore
+from src.deadline import Deadline, StageTimeout
 from src.prompts import get_prompt
 from src.utils import safe_json_parse, log_query, get_groq_api_key, evaluate_response
 
 import os
+import random
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Context characters sent to the LLM
+MAX_CONTEXT_CHARS = 4000
+
+# Backoff between LLM retries under a deadline (seconds, doubled per attempt)
+LLM_RETRY_BASE_DELAY = 0.5
+LLM_RETRY_MAX_DELAY = 8.0
+
+# Runs embed/search stages so callers can stop waiting on them. Shared by all
+# pipelines so replacing a pipeline (e.g. on every app reload) leaks no threads.
+_STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="rag-stage")
+
 
 class RAGPipeline:
     """Main RAG pipeline for question answering."""
 
-    def __init__(self, vector_store: VectorStore, model: str = "llama-3.1-8b-instant"):
-        """Initialize RAG pipeline."""
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        model: str = "llama-3.1-8b-instant",
+        max_distance: Optional[float] = None,
+        min_keyword_score: Optional[int] = None,
+        deadline_s: Optional[float] = 30.0,
+        stage_budgets: Optional[Dict[str, float]] = None
+    ):
+        """
+        Initialize RAG pipeline.
+
+        Args:
+            vector_store: Vector store to retrieve from
+            model: Groq model name
+            max_distance: Relevance gate; a chunk is usable if its cosine
+                distance is at most this value
+            min_keyword_score: Relevance gate; a chunk is usable if its
+                keyword overlap with the question is at least this value
+            deadline_s: End-to-end deadline per query in seconds (None disables)
+            stage_budgets: Overrides for src.deadline.DEFAULT_STAGE_BUDGETS
+                ("embed", "search", "rerank", "llm")
+
+        When either gate threshold is set and no retrieved chunk is usable,
+        the "I don't know" response is returned without calling the LLM.
+
+        When a stage misses its budget the query degrades instead of waiting:
+        a retrieval timeout returns a timeout response, a skipped rerank keeps
+        the vector order, and an LLM timeout returns the top passages as a
+        "retrieval-only" answer.
+        """
         self.vector_store = vector_store
         self.model = model
+        self.max_distance = max_distance
+        self.min_keyword_score = min_keyword_score
+        self.deadline_s = deadline_s
+        self.stage_budgets = stage_budgets
         self.client = Groq(api_key=get_groq_api_key())
 
-    def query(self, question: str, prompt_type: str = "improved", top_k: int = 5) -> Dict:
+    def query(
+        self,
+        question: str,
+        prompt_type: str = "improved",
+        top_k: int = 5,
+        raise_errors: bool = False,
+        deadline_s: Optional[float] = None
+    ) -> Dict:
         """
         Answer a question using RAG.
+
+        If `raise_errors` is True, LLM errors and stage timeouts are re-raised
+        instead of being turned into an error or degraded response (used by
+        the batch runner to retry). `deadline_s` overrides the pipeline's
+        end-to-end deadline for this query.
         """
+        deadline = self._new_deadline(deadline_s)
 
         # ------------------------------------------------
         # 1️⃣ Retrieve relevant documents
         # ------------------------------------------------
-        retrieved_chunks = self.vector_store.search(question, top_k=top_k)
-
-        # Apply simple reranking (BONUS FEATURE)
-        if retrieved_chunks:
-            retrieved_chunks = self.rerank_simple(retrieved_chunks, question)
+        try:
+            retrieved_chunks = self._retrieve(question, top_k, deadline)
+        except StageTimeout as e:
+            if raise_errors:
+                raise
+            return self._timeout_response(question, prompt_type, e)
 
         # ------------------------------------------------
-        # 2️⃣ Handle case where nothing retrieved
+        # 2️⃣ Handle case where nothing (usable) retrieved
         # ------------------------------------------------
         if not retrieved_chunks:
-            response = {
-                "answer": "I don't know based on the provided documents.",
-                "evidence": [],
-                "confidence": "Low",
-                "retrieved_chunks": []
-            }
+            return self._empty_response(question, prompt_type)
 
-            #  Add evaluation metrics
-            evaluation = evaluate_response(question, response, prompt_type)
-            response["evaluation"] = evaluation
-
-            log_query(question, [], response, prompt_type)
-            return response
+        if not self.passes_relevance_gate(retrieved_chunks):
+            return self._empty_response(question, prompt_type, retrieved_chunks)
 
         # ------------------------------------------------
         # 3️⃣ Build context
         # ------------------------------------------------
         context = self._build_context(retrieved_chunks)
 
+        # ------------------------------------------------
+        # 4️⃣ Generate answer
+        # ------------------------------------------------
+        return self._generate(
+            question, context, retrieved_chunks, prompt_type, self.model, deadline, raise_errors
+        )
+
+    def query_variants(
+        self,
+        question: str,
+        prompt_types: Optional[List[str]] = None,
+        models: Optional[List[str]] = None,
+        top_k: int = 5,
+        deadline_s: Optional[float] = None
+    ) -> Dict[str, Dict]:
+        """
+        Answer a question with several prompt variants and/or models.
+
+        Retrieval, reranking and context building run once; the LLM calls
+        for every (prompt_type, model) combination are issued concurrently.
+
+        Args:
+            question: User question
+            prompt_types: Prompt variants to run (default: initial and improved)
+            models: Optional list of Groq models; defaults to the pipeline model
+            top_k: Number of chunks to retrieve
+            deadline_s: Overrides the pipeline's end-to-end deadline
+
+        Returns:
+            Dict mapping variant label to response. The label is the prompt
+            type, or "prompt_type@model" when models are given.
+        """
+        prompt_types = prompt_types or ["initial", "improved"]
+
+        if models:
+            variants = [
+                (f"{prompt_type}@{model}", prompt_type, model)
+                for prompt_type in prompt_types
+                for model in models
+            ]
+        else:
+            variants = [(prompt_type, prompt_type, self.model) for prompt_type in prompt_types]
+
+        deadline = self._new_deadline(deadline_s)
+
+        try:
+            retrieved_chunks = self._retrieve(question, top_k, deadline)
+        except StageTimeout as e:
+            return {
+                label: self._timeout_response(question, prompt_type, e)
+                for label, prompt_type, _ in variants
+            }
+
+        if not retrieved_chunks:
+            return {
+                label: self._empty_response(question, prompt_type)
+                for label, prompt_type, _ in variants
+            }
+
+        if not self.passes_relevance_gate(retrieved_chunks):
+            return {
+                label: self._empty_response(question, prompt_type, list(retrieved_chunks))
+                for label, prompt_type, _ in variants
+            }
+
+        context = self._build_context(retrieved_chunks)
+
+        with ThreadPoolExecutor(max_workers=len(variants)) as executor:
+            futures = {
+                label: executor.submit(
+                    self._generate, question, context, list(retrieved_chunks), prompt_type, model, deadline
+                )
+                for label, prompt_type, model in variants
+            }
+            return {label: future.result() for label, future in futures.items()}
+
+    # ------------------------------------------------
+    # Helper: Retrieve + rerank
+    # ------------------------------------------------
+    def _new_deadline(self, deadline_s: Optional[float] = None) -> Deadline:
+        """Start the deadline clock for one query."""
+        return Deadline(
+            deadline_s if deadline_s is not None else self.deadline_s,
+            self.stage_budgets,
+            _STAGE_EXECUTOR
+        )
+
+    def _retrieve(self, question: str, top_k: int, deadline: Deadline) -> List[Dict]:
+        """
+        Embed, search and rerank within the stage budgets.
+
+        Raises:
+            StageTimeout: if embedding or search misses its budget
+        """
+        batcher = self.vector_store.query_batcher
+        if batcher is not None:
+            # The batcher's future is waitable and cancellable, so no stage
+            # thread is needed and a timed-out query is dropped from its batch
+            query_embedding = deadline.wait("embed", batcher.submit(question))
+        else:
+            query_embedding = deadline.run("embed", self.vector_store.embed_query, question)
+        retrieved_chunks = deadline.run(
+            "search", self.vector_store.search_by_embedding, query_embedding, top_k
+        )
+
+        # Apply simple reranking (BONUS FEATURE); skipped if out of time
+        rerank_budget = deadline.budget("rerank")
+        if retrieved_chunks and (rerank_budget is None or rerank_budget > 0):
+            retrieved_chunks = self.rerank_simple(retrieved_chunks, question)
+
+        return retrieved_chunks
+
+    # ------------------------------------------------
+    # Relevance gate
+    # ------------------------------------------------
+    def passes_relevance_gate(self, chunks: List[Dict]) -> bool:
+        """
+        Check whether any reranked chunk clears the relevance thresholds.
+
+        Always True when no threshold is configured.
+        """
+        if self.max_distance is None and self.min_keyword_score is None:
+            return True
+
+        for chunk in chunks:
+            if self.max_distance is not None and chunk.get("score", 0) <= self.max_distance:
+                return True
+            if self.min_keyword_score is not None and chunk.get("keyword_score", 0) >= self.min_keyword_score:
+                return True
+
+        return False
+
+    # ------------------------------------------------
+    # Helper: "I don't know" response
+    # ------------------------------------------------
+    def _empty_response(
+        self,
+        question: str,
+        prompt_type: str,
+        gated_chunks: Optional[List[Dict]] = None
+    ) -> Dict:
+        """
+        Build the response returned when nothing usable was retrieved.
+
+        `gated_chunks` are chunks rejected by the relevance gate; they are
+        kept on the response and in the log for inspection and calibration.
+        """
+        retrieved_chunks = gated_chunks or []
+        response = {
+            "answer": "I don't know based on the provided documents.",
+            "evidence": [],
+            "confidence": "Low",
+            "retrieved_chunks": retrieved_chunks
+        }
+
+        if gated_chunks:
+            response["gated"] = True
+
+        #  Add evaluation metrics
+        evaluation = evaluate_response(question, response, prompt_type)
+        response["evaluation"] = evaluation
+
+        log_query(question, retrieved_chunks, response, prompt_type)
+        return response
+
+    # ------------------------------------------------
+    # Helper: Degraded responses
+    # ------------------------------------------------
+    def _timeout_response(self, question: str, prompt_type: str, error: StageTimeout) -> Dict:
+        """Build the response returned when retrieval misses its deadline."""
+        print(f"Retrieval missed its deadline: {error}")
+
+        response = {
+            "answer": "The request timed out while searching the documents. Please try again.",
+            "evidence": [],
+            "confidence": "Low",
+            "retrieved_chunks": [],
+            "degraded": f"timeout:{error.stage}"
+        }
+
+        evaluation = evaluate_response(question, response, prompt_type)
+        response["evaluation"] = evaluation
+
+        log_query(question, [], response, prompt_type)
+        return response
+
+    def _retrieval_only_response(self, question: str, retrieved_chunks: List[Dict], prompt_type: str) -> Dict:
+        """Return the top passages with sources when the LLM misses its deadline."""
+        passages = []
+        for i, chunk in enumerate(retrieved_chunks[:3], 1):
+            source = chunk.get("metadata", {}).get("source", "Unknown")
+            text = chunk["text"][:300] + "..." if len(chunk["text"]) > 300 else chunk["text"]
+            passages.append(f"{i}. [{source}] {text}")
+
+        response = {
+            "answer": (
+                "An answer could not be generated in time. "
+                "The most relevant passages are:\n\n" + "\n\n".join(passages)
+            ),
+            "evidence": [],
+            "confidence": "Low",
+            "retrieved_chunks": retrieved_chunks,
+            "degraded": "retrieval_only"
+        }
+
+        evaluation = evaluate_response(question, response, prompt_type)
+        response["evaluation"] = evaluation
+
+        log_query(question, retrieved_chunks, response, prompt_type)
+        return response
+
+    # ------------------------------------------------
+    # Helper: Prompt + LLM call + parsing
+    # ------------------------------------------------
+    def _create_completion(self, prompt: str, model: str, deadline: Deadline, raise_errors: bool = False):
+        """
+        Call the chat completion API within the LLM budget.
+
+        Without a deadline the client's own retries apply. Under a deadline
+        each attempt is capped by the budget left, and connection errors,
+        429s and 5xx responses are retried with backoff for as long as the
+        budget allows. With raise_errors the caller (e.g. the batch runner)
+        handles retries, so a single attempt is made.
+
+        Raises:
+            StageTimeout: if the LLM budget is already exhausted
+        """
+        def create(client):
+            return client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.0,  #  more deterministic for RAG
+                max_tokens=1024
+            )
+
+        if deadline.budget("llm") is None:
+            return create(self.client)
+
+        max_retries = 0 if raise_errors else self.client.max_retries
+        for attempt in range(max_retries + 1):
+            llm_budget = deadline.budget("llm")
+            if llm_budget <= 0:
+                raise StageTimeout("llm", 0.0)
+
+            # Client-side retries would each get the full timeout again
+            client = self.client.with_options(timeout=llm_budget, max_retries=0)
+            try:
+                return create(client)
+            except (APIConnectionError, APIStatusError) as e:
+                retryable = (
+                    not isinstance(e, APITimeoutError)
+                    and (not isinstance(e, APIStatusError) or e.status_code == 429 or e.status_code >= 500)
+                )
+                delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+                if not retryable or attempt == max_retries or delay >= deadline.budget("llm"):
+                    raise
+                time.sleep(delay)
+
+    def _generate(
+        self,
+        question: str,
+        context: str,
+        retrieved_chunks: List[Dict],
+        prompt_type: str,
+        model: str,
+        deadline: Deadline,
+        raise_errors: bool = False
+    ) -> Dict:
+        """Call the LLM on a pre-built context and package the response."""
+
         # (Optional safety) Prevent overly long context
-        context = context[:4000]
+        context = context[:MAX_CONTEXT_CHARS]
 
         # ------------------------------------------------
-        # 4️⃣ Create prompt
+        # Create prompt
         # ------------------------------------------------
         prompt = get_prompt(prompt_type, context, question)
 
         # ------------------------------------------------
-        # 5️⃣ Call Groq API
+        # Call Groq API (the request is aborted when the budget runs out)
         # ------------------------------------------------
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.0,  #  more deterministic for RAG
-                max_tokens=1024
-            )
+            completion = self._create_completion(prompt, model, deadline, raise_errors)
 
             response_text = completion.choices[0].message.content
 
             # ------------------------------------------------
-            # 6️⃣ Parse response
+            # Parse response
             # ------------------------------------------------
             if prompt_type == "improved":
                 parsed = safe_json_parse(response_text)
@@ -107,19 +425,32 @@ class RAGPipeline:
                 }
 
             # ------------------------------------------------
-            #  7️⃣ Add Evaluation Metrics (NEW)
+            #  Add Evaluation Metrics (NEW)
             # ------------------------------------------------
-            evaluation = evaluate_response(question, response, prompt_type)
+            evaluation = evaluate_response(
+                question, response, prompt_type,
+                context_chunks=self._visible_chunks(retrieved_chunks)
+            )
             response["evaluation"] = evaluation
 
             # ------------------------------------------------
-            # 8️⃣ Log Query
+            # Log Query
             # ------------------------------------------------
             log_query(question, retrieved_chunks, response, prompt_type)
 
             return response
 
+        except (APITimeoutError, StageTimeout) as e:
+            if raise_errors:
+                raise
+
+            print(f"LLM missed its deadline: {e}")
+            return self._retrieval_only_response(question, retrieved_chunks, prompt_type)
+
         except Exception as e:
+            if raise_errors:
+                raise
+
             print(f"Error calling LLM: {e}")
 
             response = {
@@ -148,6 +479,28 @@ class RAGPipeline:
 
         return "\n".join(context_parts)
 
+    def _visible_chunks(self, chunks: List[Dict]) -> List[Dict]:
+        """
+        Chunks cut down to the text that survives context truncation.
+
+        Mirrors _build_context so evidence is only verified against text the
+        LLM actually saw. Indices stay aligned with `chunks`.
+        """
+        visible = []
+        position = 0
+
+        for i, chunk in enumerate(chunks, 1):
+            source = chunk.get("metadata", {}).get("source", "Unknown")
+            header = f"[Document {i} - {source}]\n"
+            text_start = position + len(header)
+            text = chunk["text"][:max(0, MAX_CONTEXT_CHARS - text_start)]
+            visible.append({**chunk, "text": text})
+
+            # Part is header + text + "\n", parts are joined with "\n"
+            position = text_start + len(chunk["text"]) + 2
+
+        return visible
+
     # ------------------------------------------------
     # BONUS: Simple Reranker
     # ------------------------------------------------
@@ -0,0 +1,168 @@
+import hashlib
+import io
+import json
+import tarfile
+from datetime import datetime
+from typing import Dict
+
+import numpy as np
+
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Page size when reading the collection for export
+EXPORT_PAGE_SIZE = 1000
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(datetime.now().timestamp())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def export_snapshot(vector_store, path: str) -> Dict:
+    """
+    Write the whole collection to a single versioned snapshot file.
+
+    The snapshot is a tar archive holding:
+    - manifest.json: format version, embedding model identity, collection
+      settings, counts and a SHA-256 checksum per data file
+    - embeddings.npy: float32 array of shape (num_chunks, dim)
+    - chunks.jsonl: one {"id", "text", "metadata"} object per row
+
+    Returns:
+        The manifest
+    """
+    ids, texts, metadatas, embeddings = [], [], [], []
+    total = vector_store.count()
+
+    for offset in range(0, total, EXPORT_PAGE_SIZE):
+        page = vector_store.collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=EXPORT_PAGE_SIZE,
+            offset=offset
+        )
+        ids.extend(page["ids"])
+        texts.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        embeddings.extend(page["embeddings"])
+
+    embedding_array = np.asarray(embeddings, dtype=np.float32)
+    if len(ids) == 0:
+        embedding_array = embedding_array.reshape(0, 0)
+
+    npy_buffer = io.BytesIO()
+    np.save(npy_buffer, embedding_array, allow_pickle=False)
+    npy_bytes = npy_buffer.getvalue()
+
+    chunks_bytes = "".join(
+        json.dumps({"id": i, "text": t, "metadata": m or {}}, ensure_ascii=False) + "\n"
+        for i, t, m in zip(ids, texts, metadatas)
+    ).encode("utf-8")
+
+    # Settings and provenance recorded on the index itself, not the
+    # options this VectorStore was opened with
+    collection_metadata = vector_store.index_metadata()
+    if "embedding_model" not in collection_metadata:
+        print(
+            "Warning: index has no recorded embedding provenance (built before it was tracked); "
+            f"assuming '{vector_store.model_name}' with the '{vector_store.embedding_backend}' backend"
+        )
+        collection_metadata["embedding_model"] = vector_store.model_name
+        collection_metadata["embedding_backend"] = vector_store.embedding_backend
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "model_name": collection_metadata["embedding_model"],
+        "embedding_backend": collection_metadata["embedding_backend"],
+        "embedding_dim": int(embedding_array.shape[1]),
+        "num_chunks": len(ids),
+        "collection_metadata": collection_metadata,
+        "files": {
+            "embeddings.npy": {"sha256": _sha256(npy_bytes), "bytes": len(npy_bytes)},
+            "chunks.jsonl": {"sha256": _sha256(chunks_bytes), "bytes": len(chunks_bytes)}
+        }
+    }
+
+    with tarfile.open(path, "w") as tar:
+        _add_member(tar, "manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+        _add_member(tar, "embeddings.npy", npy_bytes)
+        _add_member(tar, "chunks.jsonl", chunks_bytes)
+
+    print(f"Exported {len(ids)} chunks to {path}")
+    return manifest
+
+
+def import_snapshot(vector_store, path: str) -> Dict:
+    """
+    Replace the collection with the contents of a snapshot.
+
+    Checksums, format version and embedding model are verified before the
+    collection is touched. Entries are bulk-inserted with their stored
+    embeddings, so the embedding model is never loaded.
+
+    Raises:
+        ValueError: if the snapshot is corrupt, from an unsupported format
+            version, or built with a different embedding model
+
+    Returns:
+        The manifest
+    """
+    with tarfile.open(path, "r") as tar:
+        members = {m.name: m for m in tar.getmembers() if m.isfile()}
+        if "manifest.json" not in members:
+            raise ValueError(f"{path} is not a snapshot: manifest.json missing")
+
+        manifest = json.loads(tar.extractfile(members["manifest.json"]).read())
+
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot format version {manifest.get('format_version')} "
+                f"(expected {SNAPSHOT_FORMAT_VERSION})"
+            )
+
+        data = {}
+        for name, info in manifest["files"].items():
+            if name not in members:
+                raise ValueError(f"Snapshot is missing {name}")
+            data[name] = tar.extractfile(members[name]).read()
+            if _sha256(data[name]) != info["sha256"]:
+                raise ValueError(f"Checksum mismatch for {name}")
+
+    if manifest["model_name"] != vector_store.model_name:
+        raise ValueError(
+            f"Snapshot was built with '{manifest['model_name']}', "
+            f"but the vector store uses '{vector_store.model_name}'"
+        )
+    if manifest["embedding_backend"] != vector_store.embedding_backend:
+        print(
+            f"Warning: snapshot embeddings come from the '{manifest['embedding_backend']}' backend, "
+            f"queries will use '{vector_store.embedding_backend}'"
+        )
+
+    embeddings = np.load(io.BytesIO(data["embeddings.npy"]), allow_pickle=False)
+    chunks = [json.loads(line) for line in data["chunks.jsonl"].decode("utf-8").splitlines() if line]
+
+    if len(chunks) != manifest["num_chunks"] or embeddings.shape[0] != len(chunks):
+        raise ValueError("Snapshot row counts do not match its manifest")
+
+    # Recreate the collection with the snapshot's index settings and provenance
+    vector_store.collection_metadata = manifest["collection_metadata"]
+    vector_store.reset()
+
+    if chunks:
+        vector_store.add_embeddings(
+            ids=[chunk["id"] for chunk in chunks],
+            embeddings=embeddings.tolist(),
+            texts=[chunk["text"] for chunk in chunks],
+            metadatas=[chunk["metadata"] for chunk in chunks]
+        )
+
+    print(f"Imported {len(chunks)} chunks from {path}")
+    return manifest
@@ -3,6 +3,12 @@ import json
 from datetime import datetime
 from pathlib import Path
 
+from src.verification import verify_evidence
+
+
+# Minimum groundedness score for an answer to count as grounded
+GROUNDED_THRESHOLD = 0.8
+
 
 def ensure_directories():
     """Create necessary directories if they don't exist."""
@@ -21,7 +27,9 @@ def log_query(question, retrieved_chunks, response, prompt_type="improved"):
         "chunks": [
             {
                 "text": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"],
-                "metadata": chunk.get("metadata", {})
+                "metadata": chunk.get("metadata", {}),
+                "score": chunk.get("score"),
+                "keyword_score": chunk.get("keyword_score")
             }
             for chunk in retrieved_chunks
         ],
@@ -59,24 +67,39 @@ def safe_json_parse(text):
 # ⭐ NEW: Simple RAG Evaluation Metrics
 # ============================================================
 
-def evaluate_response(question: str, response: dict, prompt_type: str) -> dict:
+def evaluate_response(question: str, response: dict, prompt_type: str, context_chunks=None) -> dict:
     """
     Generate simple evaluation metrics for RAG output.
 
+    Evidence is verified against `context_chunks` (the chunk text the LLM
+    saw), defaulting to the response's retrieved chunks.
+
     Metrics:
     - Accuracy (basic heuristic)
-    - Groundedness (based on evidence presence)
+    - Groundedness (evidence quotes verified against retrieved chunks)
+    - Groundedness Score (mean per-quote support, 0-1)
     - Hallucination Risk
     - Prompt Version
+    - Evidence Matches (source chunk and offset of each quote, if any)
     """
 
     answer = response.get("answer", "")
     evidence = response.get("evidence", [])
+    if not isinstance(evidence, list):
+        evidence = [evidence]
+
+    is_idk = isinstance(answer, str) and answer.startswith("I don't know")
+
+    if context_chunks is None:
+        context_chunks = response.get("retrieved_chunks", [])
+
+    verification = verify_evidence(evidence, context_chunks)
+    score = verification["score"]
 
     # ---------------------------
     # Accuracy (simple heuristic)
     # ---------------------------
-    if isinstance(answer, str) and answer.startswith("I don't know"):
+    if is_idk:
         accuracy = "⚠️"
     else:
         accuracy = "✅"
@@ -84,23 +107,32 @@ def evaluate_response(question: str, response: dict, prompt_type: str) -> dict:
     # ---------------------------
     # Groundedness
     # ---------------------------
-    groundedness = "✅" if evidence else "⚠️"
+    groundedness = "✅" if evidence and score >= GROUNDED_THRESHOLD else "⚠️"
 
     # ---------------------------
     # Hallucination Risk
     # ---------------------------
-    if isinstance(answer, str) and answer.startswith("I don't know"):
+    if is_idk:
         hallucination = "LOW"
-    elif evidence:
+    elif not evidence:
+        hallucination = "MEDIUM"
+    elif score >= GROUNDED_THRESHOLD:
         hallucination = "LOW"
-    else:
+    elif score >= 0.5:
         hallucination = "MEDIUM"
+    else:
+        # Quotes that cannot be found in the context were made up
+        hallucination = "HIGH"
 
     evaluation = {
         "Accuracy": accuracy,
         "Groundedness": groundedness,
+        "Groundedness Score": round(score, 2),
         "Hallucination Risk": hallucination,
         "Prompt Version": prompt_type
     }
 
+    if verification["matches"]:
+        evaluation["Evidence Matches"] = verification["matches"]
+
     return evaluation
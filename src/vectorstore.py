@@ -1,34 +1,114 @@
+import threading
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import Dict, List, Optional
+from src.embeddings import (
+    DEFAULT_MODEL_NAME,
+    QueryEmbeddingBatcher,
+    encode_parallel,
+    load_embedding_model,
+    shared_query_batcher
+)
+
+try:
+    from chromadb.errors import NotFoundError
+except ImportError:
+    # Older Chroma versions raise ValueError for a missing collection
+    NotFoundError = ValueError
 
 
 class VectorStore:
     """Simple ChromaDB wrapper for document storage and retrieval."""
     
-    def __init__(self, collection_name: str = "policy_docs", persist_directory: str = "./chroma_db"):
-        """Initialize ChromaDB and embedding model."""
+    def __init__(
+        self,
+        collection_name: str = "policy_docs",
+        persist_directory: str = "./chroma_db",
+        embedding_backend: str = "torch",
+        hnsw_params: Optional[Dict] = None,
+        embedding_model=None
+    ):
+        """
+        Initialize ChromaDB and embedding model.
+        
+        The embedding model is loaded on first use, so paths that never
+        encode (snapshot import/export) skip it.
+        
+        Args:
+            embedding_backend: One of src.embeddings.EMBEDDING_BACKENDS
+            hnsw_params: Extra HNSW settings for a newly created collection, e.g.
+                {"hnsw:M": 32, "hnsw:construction_ef": 200, "hnsw:search_ef": 50}
+            embedding_model: Already-loaded model to share instead of loading one
+        """
         self.client = chromadb.PersistentClient(
             path=persist_directory,
             settings=Settings(anonymized_telemetry=False)
         )
         
-        self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.model_name = DEFAULT_MODEL_NAME
+        self.embedding_backend = embedding_backend
+        self._embedding_model = embedding_model
+        self._model_lock = threading.Lock()
         self.collection_name = collection_name
+        self.query_batcher = None
+        
+        # Metadata for collections this store creates; the embedding
+        # provenance travels with the index (see src.snapshot)
+        self.collection_metadata = {
+            "hnsw:space": "cosine",
+            **(hnsw_params or {}),
+            "embedding_model": self.model_name,
+            "embedding_backend": embedding_backend
+        }
         
         # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.collection = self._get_or_create_collection()
     
-    def add_documents(self, documents: List[dict]):
+    @property
+    def embedding_model(self):
+        """Embedding model, loaded on first access."""
+        if self._embedding_model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    self._embedding_model = load_embedding_model(self.model_name, self.embedding_backend)
+        return self._embedding_model
+    
+    def _get_or_create_collection(self):
+        """
+        Open the existing collection untouched, or create it.
+        
+        get_or_create_collection is avoided because some Chroma versions
+        overwrite an existing collection's metadata, losing the settings and
+        provenance it was built with.
+        """
+        try:
+            return self.client.get_collection(name=self.collection_name)
+        except (NotFoundError, ValueError):
+            return self.client.create_collection(
+                name=self.collection_name,
+                metadata=self.collection_metadata
+            )
+    
+    def index_metadata(self) -> Dict:
+        """Settings and embedding provenance the current collection was built with."""
+        return dict(self.collection.metadata or {})
+    
+    def add_documents(
+        self,
+        documents: List[dict],
+        num_workers: int = 1,
+        batch_size: int = 32,
+        embeddings: Optional[List[List[float]]] = None
+    ):
         """
         Add documents to the vector store.
         
         Args:
             documents: List of dicts with 'text' and 'metadata' keys
+            num_workers: Embedding worker processes (> 1 enables the parallel pool)
+            batch_size: Embedding batch size
+            embeddings: Precomputed embeddings (list or array) aligned with
+                `documents`; skips encoding
         """
         if not documents:
             print("No documents to add")
@@ -38,19 +118,53 @@ class VectorStore:
         metadatas = [doc.get("metadata", {}) for doc in documents]
         ids = [f"doc_{i}" for i in range(len(documents))]
         
+        built_with = self.index_metadata().get("embedding_backend")
+        if embeddings is None and built_with and built_with != self.embedding_backend:
+            print(
+                f"Warning: index was built with the '{built_with}' backend, "
+                f"adding chunks embedded with '{self.embedding_backend}'"
+            )
+        
         # Generate embeddings
-        embeddings = self.embedding_model.encode(texts).tolist()
+        if embeddings is not None:
+            embeddings = embeddings.tolist() if hasattr(embeddings, "tolist") else list(embeddings)
+        elif num_workers > 1:
+            embeddings = encode_parallel(
+                texts, self.model_name, self.embedding_backend, num_workers, batch_size
+            ).tolist()
+        else:
+            embeddings = self.embedding_model.encode(texts, batch_size=batch_size).tolist()
         
         # Add to ChromaDB
-        self.collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        self.add_embeddings(ids, embeddings, texts, metadatas)
         
         print(f"Added {len(documents)} chunks to vector store")
     
+    def add_embeddings(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        texts: List[str],
+        metadatas: List[dict]
+    ):
+        """Bulk insert precomputed entries in batches Chroma accepts."""
+        max_batch = self._max_batch_size()
+        
+        for start in range(0, len(ids), max_batch):
+            end = start + max_batch
+            self.collection.add(
+                embeddings=embeddings[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+                ids=ids[start:end]
+            )
+    
+    def _max_batch_size(self) -> int:
+        """Largest insert batch supported by the Chroma client."""
+        if hasattr(self.client, "get_max_batch_size"):
+            return self.client.get_max_batch_size()
+        return getattr(self.client, "max_batch_size", 5000)
+    
     def search(self, query: str, top_k: int = 5) -> List[dict]:
         """
         Search for relevant documents.
@@ -58,12 +172,47 @@ class VectorStore:
         Returns:
             List of dicts with 'text', 'metadata', and 'score' keys
         """
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode([query]).tolist()
+        return self.search_by_embedding(self.embed_query(query), top_k)
+    
+    def embed_query(self, query: str, timeout: Optional[float] = None) -> List[float]:
+        """
+        Embed a single query (micro-batched with concurrent queries if enabled).
+        
+        `timeout` only applies to batched encodes, which are cancelled when
+        it expires.
+        """
+        if self.query_batcher is not None:
+            return self.query_batcher.encode(query, timeout=timeout)
+        return self.embedding_model.encode([query])[0].tolist()
+    
+    def enable_query_batching(self, max_batch_size: int = 32, max_wait_ms: float = 5.0) -> QueryEmbeddingBatcher:
+        """
+        Route query embeddings through the process-wide micro-batcher.
+        
+        Worthwhile when many threads or sessions query at once; a lone query
+        waits at most `max_wait_ms` longer. All stores using the same model
+        and backend share one batcher (and one model copy for queries).
+        Returns the batcher so its metrics() can be inspected.
+        """
+        if self.query_batcher is None:
+            self.query_batcher = shared_query_batcher(
+                self.model_name,
+                self.embedding_backend,
+                lambda: self.embedding_model,
+                max_batch_size,
+                max_wait_ms
+            )
+        return self.query_batcher
+    
+    def search_by_embedding(self, query_embedding: List[float], top_k: int = 5) -> List[dict]:
+        """
+        Search with a precomputed query embedding.
         
-        # Search
+        Returns:
+            List of dicts with 'text', 'metadata', and 'score' keys
+        """
         results = self.collection.query(
-            query_embeddings=query_embedding,
+            query_embeddings=[query_embedding],
             n_results=top_k
         )
         
@@ -84,7 +233,7 @@ class VectorStore:
         self.client.delete_collection(self.collection_name)
         self.collection = self.client.create_collection(
             name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}
+            metadata=self.collection_metadata
         )
         print("Vector store reset")
     
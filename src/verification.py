@@ -0,0 +1,253 @@
+import difflib
+import re
+from collections import Counter, deque
+from typing import Dict, List, Sequence, Tuple
+
+
+# Typographic characters LLMs commonly substitute when quoting
+_CHAR_MAP = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u00a0": " "
+})
+
+# Characters stripped from both ends of a quote before matching
+_QUOTE_STRIP = " \"'.,;:\u2026"
+
+# Words, keeping contractions such as "can't" whole
+_TOKEN_RE = re.compile(r"\w+(?:'\w+)*")
+
+# Words that flip a statement's meaning; like numbers, they must match exactly
+NEGATION_WORDS = frozenset({
+    "not", "no", "never", "none", "nor", "neither", "nobody", "nothing",
+    "nowhere", "without", "cannot", "unless"
+})
+
+# Consecutive quote tokens that must appear verbatim to seed a fuzzy match
+ANCHOR_TOKENS = 3
+
+
+def normalize_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """
+    Lowercase, unify quotes/dashes and collapse whitespace runs.
+
+    Returns:
+        Tuple of (normalized text, list mapping each normalized character
+        index to its index in the original text)
+    """
+    chars = []
+    offsets = []
+    previous_space = True
+
+    for i, original in enumerate(text.translate(_CHAR_MAP)):
+        # lower() may expand a character, so map every output char back to i
+        for ch in original.lower():
+            if ch.isspace():
+                if previous_space:
+                    continue
+                ch = " "
+                previous_space = True
+            else:
+                previous_space = False
+            chars.append(ch)
+            offsets.append(i)
+
+    if chars and chars[-1] == " ":
+        chars.pop()
+        offsets.pop()
+
+    return "".join(chars), offsets
+
+
+def normalize_quote(quote: str) -> str:
+    """Normalize an evidence quote the same way as chunk text, minus wrapping punctuation."""
+    normalized, _ = normalize_with_offsets(quote)
+    return normalized.strip(_QUOTE_STRIP)
+
+
+class AhoCorasick:
+    """
+    Multi-pattern exact matcher: one pass over the text finds every pattern.
+
+    Patterns and text may be strings or sequences of tokens.
+    """
+
+    def __init__(self, patterns: Sequence[Sequence[str]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        self.lengths = [len(p) for p in patterns]
+
+        for pattern_id, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.output[node].append(pattern_id)
+
+        # Breadth-first construction of failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text: Sequence[str]) -> List[Tuple[int, int]]:
+        """
+        Find all pattern occurrences.
+
+        Returns:
+            List of (start index, pattern id)
+        """
+        matches = []
+        node = 0
+
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for pattern_id in self.output[node]:
+                matches.append((i - self.lengths[pattern_id] + 1, pattern_id))
+
+        return matches
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """
+    Split normalized text into word tokens, dropping whitespace and punctuation.
+
+    Returns:
+        List of (token, start, end) with offsets into `text`
+    """
+    return [(m.group(), m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+
+
+def _is_protected(token: str) -> bool:
+    """Numbers and negations change meaning and may not differ in a fuzzy match."""
+    return any(ch.isdigit() for ch in token) or token in NEGATION_WORDS or token.endswith("n't")
+
+
+def _protected_tokens(tokens: Sequence[str]) -> Counter:
+    return Counter(token for token in tokens if _is_protected(token))
+
+
+def _anchors(tokens: List[str]) -> List[Tuple[str, ...]]:
+    """Every run of ANCHOR_TOKENS consecutive tokens (the whole quote if shorter)."""
+    n = min(ANCHOR_TOKENS, len(tokens))
+    return [tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+
+
+def verify_evidence(evidence: List[str], chunks: List[Dict], fuzzy_threshold: float = 0.85) -> Dict:
+    """
+    Check evidence quotes against the retrieved chunk texts.
+
+    All quotes are matched exactly (after normalization) in a single
+    Aho-Corasick pass over each chunk. Quotes without an exact match fall
+    back to fuzzy matching on word tokens, which ignores whitespace and
+    punctuation and tolerates small spelling differences. Fuzzy candidates
+    are only quote-length token windows around a run of ANCHOR_TOKENS
+    words that appears verbatim in the chunk, and a window is rejected
+    unless its numbers and negation words equal the quote's, so "20 days"
+    never supports "30 days" and "may not" never supports "may".
+
+    Args:
+        evidence: Quotes returned by the LLM; non-string or empty items get
+            an unmatched entry so matches stay aligned with the evidence list
+        chunks: Chunks with 'text' and 'metadata' keys, limited to the text
+            the LLM actually saw
+        fuzzy_threshold: Minimum similarity for a fuzzy match to count
+
+    Returns:
+        Dict with 'score' (mean per-quote support in [0, 1]; 0 without
+        evidence) and 'matches' (per quote: chunk index, source, character
+        offsets in the original chunk text, match type and similarity)
+    """
+    matches = [
+        {"quote": q, "chunk": None, "source": None, "start": None, "end": None, "match": None, "similarity": 0.0}
+        for q in evidence
+    ]
+    patterns = [normalize_quote(q) if isinstance(q, str) else "" for q in evidence]
+    searchable = [quote_id for quote_id, pattern in enumerate(patterns) if pattern]
+
+    if not searchable:
+        return {"score": 0.0, "matches": matches}
+
+    automaton = AhoCorasick([patterns[quote_id] for quote_id in searchable])
+    normalized_chunks = [normalize_with_offsets(chunk.get("text", "")) for chunk in chunks]
+
+    def record(quote_id, chunk_id, start, end, match_type, similarity):
+        offsets = normalized_chunks[chunk_id][1]
+        matches[quote_id].update({
+            "chunk": chunk_id,
+            "source": chunks[chunk_id].get("metadata", {}).get("source", "Unknown"),
+            "start": offsets[start],
+            "end": offsets[end - 1] + 1,
+            "match": match_type,
+            "similarity": round(similarity, 3)
+        })
+
+    # Exact matches: first occurrence in the highest-ranked chunk wins
+    for chunk_id, (text, _) in enumerate(normalized_chunks):
+        for start, pattern_id in automaton.search(text):
+            quote_id = searchable[pattern_id]
+            if matches[quote_id]["match"] is None:
+                record(quote_id, chunk_id, start, start + len(patterns[quote_id]), "exact", 1.0)
+
+    # Fuzzy fallback for the rest, on token windows seeded by exact anchors
+    unmatched = [quote_id for quote_id in searchable if matches[quote_id]["match"] is None]
+    if unmatched:
+        quote_tokens = {quote_id: [t for t, _, _ in tokenize(patterns[quote_id])] for quote_id in unmatched}
+        anchors = []
+        anchor_owners = []
+        for quote_id in unmatched:
+            if not quote_tokens[quote_id]:
+                continue
+            for offset, anchor in enumerate(_anchors(quote_tokens[quote_id])):
+                anchors.append(anchor)
+                anchor_owners.append((quote_id, offset))
+        anchor_automaton = AhoCorasick(anchors)
+
+        best = {quote_id: (0.0, None, 0, 0) for quote_id in unmatched}
+        for chunk_id, (text, _) in enumerate(normalized_chunks):
+            chunk_tokens = tokenize(text)
+            words = [t for t, _, _ in chunk_tokens]
+            candidates = set()
+            for position, anchor_id in anchor_automaton.search(words):
+                quote_id, offset = anchor_owners[anchor_id]
+                candidates.add((quote_id, position - offset))
+
+            for quote_id, seed in candidates:
+                tokens = quote_tokens[quote_id]
+                slack = max(1, len(tokens) // 10)
+                lo = max(0, seed - slack)
+                region = words[lo:seed + len(tokens) + slack]
+
+                # Trim the region to the span aligned with the quote
+                blocks = [b for b in difflib.SequenceMatcher(None, region, tokens, autojunk=False).get_matching_blocks() if b.size]
+                first = lo + blocks[0].a
+                last = lo + blocks[-1].a + blocks[-1].size
+                window = words[first:last]
+                if _protected_tokens(window) != _protected_tokens(tokens):
+                    continue
+
+                similarity = difflib.SequenceMatcher(None, " ".join(window), " ".join(tokens), autojunk=False).ratio()
+                if similarity > best[quote_id][0]:
+                    best[quote_id] = (similarity, chunk_id, chunk_tokens[first][1], chunk_tokens[last - 1][2])
+
+        for quote_id in unmatched:
+            similarity, chunk_id, start, end = best[quote_id]
+            if chunk_id is not None and similarity >= fuzzy_threshold:
+                record(quote_id, chunk_id, start, end, "fuzzy", similarity)
+            else:
+                matches[quote_id]["similarity"] = round(similarity, 3)
+
+    supported = [m["similarity"] if m["match"] else 0.0 for m in matches]
+    return {"score": sum(supported) / len(supported), "matches": matches}
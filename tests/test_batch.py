@@ -0,0 +1,186 @@
+import json
+import time
+
+import httpx
+from groq import APIStatusError
+
+from src.batch import TokenBucket, compact_results, load_completed_ids, read_questions, run_batch
+from src.deadline import StageTimeout
+
+
+def make_status_error(status_code):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(status_code, request=request)
+    return APIStatusError(f"HTTP {status_code}", response=response, body=None)
+
+
+class FakeClient:
+    def with_options(self, **kwargs):
+        return self
+
+
+class FakePipeline:
+    """Answers every question; can fail the first N calls per question."""
+
+    def __init__(self, failures=None):
+        self.client = FakeClient()
+        self.failures = dict(failures or {})
+        self.calls = []
+
+    def query(self, question, **kwargs):
+        self.calls.append(question)
+        if self.failures.get(question):
+            self.failures[question] -= 1
+            raise make_status_error(429)
+        return {
+            "answer": f"answer to {question}",
+            "evidence": [],
+            "confidence": "High",
+            "retrieved_chunks": [{"text": "t", "metadata": {"source": "a.md"}, "score": 0.1}]
+        }
+
+
+def read_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def fast_batch(pipeline, questions, output, **kwargs):
+    return run_batch(
+        pipeline, questions, str(output),
+        requests_per_minute=60000, tokens_per_minute=1e9, base_delay=0.001, max_delay=0.01,
+        **kwargs
+    )
+
+
+def test_default_ids_follow_question_text(tmp_path):
+    path = tmp_path / "questions.txt"
+    path.write_text("What is the leave policy?\n# comment\n\nCan I work remotely?\n")
+    before = {q["question"]: q["id"] for q in read_questions(str(path))}
+
+    path.write_text("New question first?\nWhat is the leave policy?\nCan I work remotely?\n")
+    after = {q["question"]: q["id"] for q in read_questions(str(path))}
+
+    assert len(before) == 2
+    for question, question_id in before.items():
+        assert after[question] == question_id
+    assert after["New question first?"] not in before.values()
+
+
+def test_explicit_ids_and_duplicate_questions(tmp_path):
+    path = tmp_path / "questions.csv"
+    path.write_text("id,question\nq1,Same?\n,Same?\n,Same?\n")
+
+    questions = read_questions(str(path))
+
+    assert questions[0]["id"] == "q1"
+    assert len(questions) == 2
+
+
+def test_completed_ids_skip_errors_and_partial_lines(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(
+        json.dumps({"id": "a", "answer": "x"}) + "\n"
+        + json.dumps({"id": "b", "error": "RateLimitError"}) + "\n"
+        + '{"id": "c", "ans'
+    )
+
+    assert load_completed_ids(str(path)) == {"a"}
+
+
+def test_retries_rate_limit_then_succeeds(tmp_path):
+    output = tmp_path / "results.jsonl"
+    pipeline = FakePipeline(failures={"Q1?": 2})
+
+    summary = fast_batch(pipeline, [{"id": "1", "question": "Q1?"}], output)
+
+    assert summary["answered"] == 1
+    assert pipeline.calls == ["Q1?"] * 3
+    assert read_results(output)[0]["answer"] == "answer to Q1?"
+
+
+def test_gives_up_after_max_retries_and_resumes(tmp_path):
+    output = tmp_path / "results.jsonl"
+    questions = [{"id": "1", "question": "Q1?"}, {"id": "2", "question": "Q2?"}]
+
+    summary = fast_batch(FakePipeline(failures={"Q2?": 10}), questions, output, max_retries=1)
+    assert summary == {"total": 2, "skipped": 0, "answered": 1, "failed": 1}
+    assert "error" in [r for r in read_results(output) if r["id"] == "2"][0]
+
+    # Re-run only retries the failed question
+    pipeline = FakePipeline()
+    summary = fast_batch(pipeline, questions, output)
+    assert summary["skipped"] == 1
+    assert pipeline.calls == ["Q2?"]
+    assert load_completed_ids(str(output)) == {"1", "2"}
+
+    # The error record was replaced by the answer
+    results = read_results(output)
+    assert [r["id"] for r in results] == ["1", "2"]
+    assert all("error" not in r for r in results)
+
+
+def test_compact_results_keeps_last_record_per_id(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(
+        '{"id": "a", "error": "boom"}\n'
+        '{"id": "b", "answer": "B"}\n'
+        '{"id": "a", "answer": "A"}\n'
+        '{"id": "c", "ans',
+        encoding="utf-8"
+    )
+
+    compact_results(str(path))
+
+    assert read_results(path) == [{"id": "a", "answer": "A"}, {"id": "b", "answer": "B"}]
+
+
+def test_non_retryable_errors_are_not_retried(tmp_path):
+    output = tmp_path / "results.jsonl"
+
+    class BadRequestPipeline(FakePipeline):
+        def query(self, question, **kwargs):
+            self.calls.append(question)
+            raise make_status_error(400)
+
+    pipeline = BadRequestPipeline()
+    summary = fast_batch(pipeline, [{"id": "1", "question": "Q1?"}], output)
+
+    assert summary["failed"] == 1
+    assert pipeline.calls == ["Q1?"]
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate_per_minute=600, capacity=1)  # 10 per second
+
+    start = time.monotonic()
+    for _ in range(3):
+        assert bucket.acquire(1)
+    elapsed = time.monotonic() - start
+
+    assert 0.15 <= elapsed < 1.0
+
+
+def test_token_bucket_clamps_oversized_requests():
+    bucket = TokenBucket(rate_per_minute=60000, capacity=10)
+
+    assert bucket.acquire(1000)
+
+
+def test_stage_timeouts_are_retried(tmp_path):
+    output = tmp_path / "results.jsonl"
+
+    class SlowSearchPipeline(FakePipeline):
+        def query(self, question, **kwargs):
+            assert kwargs["raise_errors"] is True
+            if not self.calls:
+                self.calls.append(question)
+                raise StageTimeout("search", 5.0)
+            return super().query(question, **kwargs)
+
+    pipeline = SlowSearchPipeline()
+    summary = fast_batch(pipeline, [{"id": "1", "question": "Q1?"}], output)
+
+    assert summary["answered"] == 1
+    assert len(pipeline.calls) == 2
+    assert "error" not in read_results(output)[0]
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from src.loader import load_buffers, load_file, load_text
+
+
+FILES = [
+    ("a.txt", b"Annual leave is 20 days."),
+    ("broken.txt", b"\xff\xfe not utf-8 \xff"),
+    ("b.md", "# Remote work\nApproval is required.".encode("utf-8")),
+    ("image.png", b"\x89PNG"),
+    ("c.txt", b"Expenses are reimbursed monthly."),
+]
+
+
+def test_load_text_accepts_bytes_and_file_like(tmp_path):
+    path = tmp_path / "policy.txt"
+    path.write_text("Leave policy", encoding="utf-8")
+
+    assert load_text(b"Leave policy") == "Leave policy"
+    with open(path, "rb") as f:
+        assert load_text(f) == "Leave policy"
+    assert load_text(path) == "Leave policy"
+
+
+def test_load_file_dispatches_on_extension():
+    doc = load_file("guide.md", b"# Guide")
+    assert doc == {"text": "# Guide", "metadata": {"source": "guide.md", "type": "md"}}
+    assert load_file("image.png", b"\x89PNG") is None
+    assert load_file("empty.txt", b"   \n") is None
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_load_buffers_keeps_input_order_and_isolates_errors(max_workers):
+    progress = []
+
+    documents, errors = load_buffers(
+        FILES,
+        max_workers=max_workers,
+        progress_callback=lambda *args: progress.append(args),
+    )
+
+    assert [doc["metadata"]["source"] for doc in documents] == ["a.txt", "b.md", "c.txt"]
+    assert documents[0]["text"] == "Annual leave is 20 days."
+    assert [name for name, _ in errors] == ["broken.txt"]
+    assert "utf-8" in errors[0][1]
+
+    # One callback per file, counting up to the total
+    assert [done for done, *_ in progress] == [1, 2, 3, 4, 5]
+    assert all(total == len(FILES) for _, total, _, _ in progress)
+    assert sorted(name for _, _, name, _ in progress) == sorted(name for name, _ in FILES)
+    assert [name for _, _, name, error in progress if error] == ["broken.txt"]
+
+
+def test_load_buffers_empty_input():
+    assert load_buffers([]) == ([], [])
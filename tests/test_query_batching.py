@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.deadline import Deadline, StageTimeout
+from src.embeddings import QueryEmbeddingBatcher, shared_query_batcher
+
+
+class FakeModel:
+    """Embeds a text as [len(text), 1.0]; can block until released."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def encode(self, texts):
+        self.release.wait()
+        time.sleep(self.delay)
+        self.batches.append(list(texts))
+        return np.array([[len(t), 1.0] for t in texts])
+
+
+def test_concurrent_queries_are_batched_and_returned_in_order():
+    model = FakeModel(delay=0.01)
+    batcher = QueryEmbeddingBatcher(model, max_batch_size=8, max_wait_ms=20)
+
+    queries = ["x" * i for i in range(40)]
+    with ThreadPoolExecutor(max_workers=40) as executor:
+        results = list(executor.map(batcher.encode, queries))
+    batcher.close()
+
+    assert [r[0] for r in results] == list(range(40))
+    metrics = batcher.metrics()
+    assert metrics["requests"] == 40
+    assert metrics["mean_batch_size"] > 1
+    assert max(metrics["batch_size_histogram"]) <= 8
+
+
+def test_lone_query_waits_at_most_max_wait():
+    batcher = QueryEmbeddingBatcher(FakeModel(), max_batch_size=32, max_wait_ms=5)
+
+    start = time.monotonic()
+    batcher.encode("hello")
+    elapsed = time.monotonic() - start
+    batcher.close()
+
+    assert elapsed < 0.5
+    assert batcher.metrics()["batch_size_histogram"] == {1: 1}
+
+
+def test_timed_out_request_is_cancelled_and_not_encoded():
+    model = FakeModel()
+    model.release.clear()
+    batcher = QueryEmbeddingBatcher(model, max_batch_size=1, max_wait_ms=0)
+
+    # Occupies the batcher thread until released
+    blocker = batcher.submit("blocker")
+    time.sleep(0.05)
+
+    with pytest.raises(TimeoutError):
+        batcher.encode("too slow", timeout=0.05)
+
+    model.release.set()
+    assert blocker.result(timeout=1)[0] == len("blocker")
+    batcher.close()
+
+    assert model.batches == [["blocker"]]
+
+
+def test_deadline_wait_cancels_batched_embed():
+    model = FakeModel()
+    model.release.clear()
+    batcher = QueryEmbeddingBatcher(model, max_batch_size=1, max_wait_ms=0)
+    batcher.submit("blocker")
+    time.sleep(0.05)
+
+    deadline = Deadline(10.0, {"embed": 0.05})
+    future = batcher.submit("question")
+    with pytest.raises(StageTimeout):
+        deadline.wait("embed", future)
+
+    assert future.cancelled()
+    model.release.set()
+    batcher.close()
+
+
+def test_shared_batcher_is_created_once_per_model_and_backend():
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return FakeModel()
+
+    first = shared_query_batcher("test-model", "torch", loader)
+    second = shared_query_batcher("test-model", "torch", loader)
+    other = shared_query_batcher("test-model", "onnx", loader)
+
+    assert first is second
+    assert other is not first
+    assert len(loads) == 2
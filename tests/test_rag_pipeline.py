@@ -0,0 +1,174 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import APIStatusError
+
+pytest.importorskip("chromadb")
+
+from src import rag_pipeline
+from src.rag_pipeline import RAGPipeline
+
+
+def make_status_error(status_code):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(status_code, request=request)
+    return APIStatusError(f"HTTP {status_code}", response=response, body=None)
+
+
+class FakeVectorStore:
+    """Returns fixed chunks; counts embed and search calls."""
+
+    def __init__(self, chunks=None, search_delay=0.0):
+        self.chunks = chunks if chunks is not None else [
+            {"text": "Employees get 20 days of paid leave.", "metadata": {"source": "leave.md"}, "score": 0.2},
+            {"text": "Remote work needs approval.", "metadata": {"source": "remote.md"}, "score": 0.4},
+        ]
+        self.search_delay = search_delay
+        self.query_batcher = None
+        self.embed_calls = 0
+        self.search_calls = 0
+
+    def embed_query(self, query, timeout=None):
+        self.embed_calls += 1
+        return [0.0, 1.0]
+
+    def search_by_embedding(self, embedding, top_k=5):
+        self.search_calls += 1
+        time.sleep(self.search_delay)
+        return [dict(chunk) for chunk in self.chunks[:top_k]]
+
+
+class FakeCompletions:
+    def __init__(self, delay, errors):
+        self.delay = delay
+        self.errors = list(errors)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def create(self, model, messages, **kwargs):
+        with self.lock:
+            self.calls.append(model)
+            error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+        time.sleep(self.delay)
+        content = '{"answer": "20 days", "evidence": ["20 days of paid leave"], "confidence": "High"}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeClient:
+    max_retries = 2
+
+    def __init__(self, delay=0.0, errors=()):
+        self.chat = SimpleNamespace(completions=FakeCompletions(delay, errors))
+        self.options = []
+
+    def with_options(self, **kwargs):
+        self.options.append(kwargs)
+        return self
+
+
+@pytest.fixture
+def make_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+
+    def make(vector_store=None, llm_delay=0.0, llm_errors=(), **kwargs):
+        pipeline = RAGPipeline(vector_store or FakeVectorStore(), **kwargs)
+        pipeline.client = FakeClient(llm_delay, llm_errors)
+        return pipeline
+
+    return make
+
+
+def test_retrieval_runs_once_for_all_variants(make_pipeline):
+    store = FakeVectorStore()
+    pipeline = make_pipeline(store)
+
+    results = pipeline.query_variants("How much leave?", prompt_types=["initial", "improved"])
+
+    assert set(results) == {"initial", "improved"}
+    assert store.embed_calls == 1
+    assert store.search_calls == 1
+    assert results["improved"]["answer"] == "20 days"
+    assert results["initial"]["confidence"] == "N/A"
+    assert len(pipeline.client.chat.completions.calls) == 2
+
+
+def test_llm_calls_overlap(make_pipeline):
+    pipeline = make_pipeline(llm_delay=0.3)
+
+    start = time.monotonic()
+    results = pipeline.query_variants("How much leave?", prompt_types=["initial", "improved"], models=["a", "b"])
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 4
+    # Four 0.3s calls run side by side, not back to back
+    assert elapsed < 0.3 * 2
+
+
+def test_labels_include_model_when_models_given(make_pipeline):
+    pipeline = make_pipeline()
+
+    results = pipeline.query_variants("How much leave?", prompt_types=["initial", "improved"], models=["m1", "m2"])
+
+    assert set(results) == {"initial@m1", "initial@m2", "improved@m1", "improved@m2"}
+    assert sorted(pipeline.client.chat.completions.calls) == ["m1", "m1", "m2", "m2"]
+
+
+def test_relevance_gate_applies_to_every_variant(make_pipeline):
+    pipeline = make_pipeline(max_distance=0.1)
+
+    results = pipeline.query_variants("Off-topic question", prompt_types=["initial", "improved"], models=["m1", "m2"])
+
+    assert len(results) == 4
+    for response in results.values():
+        assert response["gated"] is True
+        assert response["answer"].startswith("I don't know")
+    assert pipeline.client.chat.completions.calls == []
+
+
+def test_retrieval_timeout_applies_to_every_variant(make_pipeline):
+    pipeline = make_pipeline(FakeVectorStore(search_delay=0.5), stage_budgets={"search": 0.05})
+
+    results = pipeline.query_variants("How much leave?", prompt_types=["initial", "improved"])
+
+    assert set(results) == {"initial", "improved"}
+    for response in results.values():
+        assert response["degraded"] == "timeout:search"
+        assert response["retrieved_chunks"] == []
+    assert pipeline.client.chat.completions.calls == []
+
+
+def test_llm_errors_are_retried_within_the_budget(make_pipeline, monkeypatch):
+    monkeypatch.setattr(rag_pipeline, "LLM_RETRY_BASE_DELAY", 0.01)
+    pipeline = make_pipeline(llm_errors=[make_status_error(503), make_status_error(429)])
+
+    response = pipeline.query("How much leave?")
+
+    assert response["answer"] == "20 days"
+    assert len(pipeline.client.chat.completions.calls) == 3
+    # Each attempt is capped by the remaining budget, without SDK retries
+    assert all(options["max_retries"] == 0 and options["timeout"] <= 25 for options in pipeline.client.options)
+
+
+def test_raise_errors_makes_a_single_llm_attempt(make_pipeline):
+    pipeline = make_pipeline(llm_errors=[make_status_error(503)])
+
+    with pytest.raises(APIStatusError):
+        pipeline.query("How much leave?", raise_errors=True)
+
+    assert len(pipeline.client.chat.completions.calls) == 1
+
+
+def test_client_errors_are_not_retried(make_pipeline):
+    pipeline = make_pipeline(llm_errors=[make_status_error(400)])
+
+    response = pipeline.query("How much leave?")
+
+    assert response["answer"] == "The system encountered an error while generating a response."
+    assert len(pipeline.client.chat.completions.calls) == 1
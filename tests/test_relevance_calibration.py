@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from src.evaluation import calibrate_relevance_threshold, load_relevance_features_from_log
+
+
+def feature(distance, keyword_score, answerable):
+    return {"best_distance": distance, "best_keyword_score": keyword_score, "answerable": answerable}
+
+
+def test_distance_only_threshold_separates_classes():
+    features = [
+        feature(0.20, 0, True),
+        feature(0.30, 0, True),
+        feature(0.55, 0, False),
+        feature(0.70, 0, False),
+    ]
+
+    result = calibrate_relevance_threshold(features, target_recall=1.0)
+
+    assert result["max_distance"] == 0.30
+    assert result["min_keyword_score"] is None
+    assert result["recall"] == 1.0
+    assert result["rejection_rate"] == 1.0
+
+
+def test_keyword_threshold_rescues_far_answerable_question():
+    features = [
+        feature(0.20, 3, True),
+        feature(0.50, 4, True),
+        feature(0.45, 0, False),
+        feature(0.60, 1, False),
+    ]
+
+    result = calibrate_relevance_threshold(features, target_recall=1.0)
+
+    # Distance alone would need 0.50 and let the 0.45 question through
+    assert result["max_distance"] == 0.20
+    assert result["min_keyword_score"] == 3
+    assert result["rejection_rate"] == 1.0
+
+
+def test_target_recall_trades_off_rejection():
+    features = [feature(d / 100, 0, True) for d in range(10, 30)] + [feature(0.25, 0, False)]
+
+    strict = calibrate_relevance_threshold(features, target_recall=1.0)
+    loose = calibrate_relevance_threshold(features, target_recall=0.7)
+
+    assert strict["rejection_rate"] == 0.0
+    assert loose["rejection_rate"] == 1.0
+    assert loose["recall"] >= 0.7
+
+
+def test_requires_answerable_questions():
+    with pytest.raises(ValueError):
+        calibrate_relevance_threshold([feature(0.5, 0, False)])
+
+
+def test_log_features_skip_gated_and_initial_prompt_entries(tmp_path):
+    def entry(prompt_type, answer, scores, gated=False):
+        response = {"answer": answer}
+        if gated:
+            response["gated"] = True
+        return {
+            "prompt_type": prompt_type,
+            "chunks": [{"score": s, "keyword_score": 2} for s in scores],
+            "response": response
+        }
+
+    log = tmp_path / "queries.jsonl"
+    log.write_text("\n".join(json.dumps(e) for e in [
+        entry("improved", "Yes, 20 days.", [0.4, 0.2]),
+        entry("improved", "I don't know based on the provided documents.", [0.6]),
+        entry("improved", "I don't know based on the provided documents.", [0.9], gated=True),
+        entry("initial", "Something", [0.1]),
+        entry("improved", "No scores logged", [None]),
+    ]) + "\n")
+
+    features = load_relevance_features_from_log(str(log))
+
+    assert features == [
+        feature(0.2, 2, True),
+        feature(0.6, 2, False),
+    ]
@@ -0,0 +1,62 @@
+import io
+import tarfile
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from src.snapshot import export_snapshot, import_snapshot
+from src.vectorstore import VectorStore
+
+
+def build_store(path, **kwargs):
+    store = VectorStore(persist_directory=str(path), **kwargs)
+    docs = [{"text": f"chunk {i}", "metadata": {"source": "leave.md", "chunk_id": i}} for i in range(30)]
+    store.add_documents(docs, embeddings=np.random.rand(30, 8).astype(np.float32))
+    return store
+
+
+def test_round_trip_keeps_index_settings_and_provenance(tmp_path):
+    build_store(tmp_path / "a", embedding_backend="onnx-int8", hnsw_params={"hnsw:M": 32, "hnsw:search_ef": 50})
+
+    # Reopened with different options, as the CLI does
+    source = VectorStore(persist_directory=str(tmp_path / "a"))
+    manifest = export_snapshot(source, str(tmp_path / "index.snap"))
+
+    assert manifest["embedding_backend"] == "onnx-int8"
+    assert manifest["collection_metadata"]["hnsw:M"] == 32
+
+    target = VectorStore(persist_directory=str(tmp_path / "b"), embedding_backend="onnx-int8")
+    import_snapshot(target, str(tmp_path / "index.snap"))
+
+    assert target.count() == 30
+    assert target.index_metadata()["hnsw:search_ef"] == 50
+    assert target.index_metadata()["embedding_backend"] == "onnx-int8"
+    # Import never needs the embedding model
+    assert target._embedding_model is None
+
+    original = source.collection.get(ids=["doc_7"], include=["embeddings", "documents"])
+    copied = target.collection.get(ids=["doc_7"], include=["embeddings", "documents"])
+    assert copied["documents"] == original["documents"]
+    np.testing.assert_allclose(copied["embeddings"][0], original["embeddings"][0])
+
+
+def test_corrupted_snapshot_is_rejected_before_import(tmp_path):
+    build_store(tmp_path / "a")
+    export_snapshot(VectorStore(persist_directory=str(tmp_path / "a")), str(tmp_path / "index.snap"))
+
+    # Rewrite the archive with a tampered chunks file
+    with tarfile.open(tmp_path / "index.snap") as tar:
+        members = {m.name: tar.extractfile(m).read() for m in tar.getmembers()}
+    members["chunks.jsonl"] = members["chunks.jsonl"].replace(b"chunk 1", b"chunk X")
+    with tarfile.open(tmp_path / "bad.snap", "w") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    target = build_store(tmp_path / "b")
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        import_snapshot(target, str(tmp_path / "bad.snap"))
+    assert target.count() == 30
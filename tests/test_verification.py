@@ -0,0 +1,124 @@
+from src.utils import evaluate_response
+from src.verification import AhoCorasick, normalize_with_offsets, verify_evidence
+
+
+def chunk(text, source="policy.md"):
+    return {"text": text, "metadata": {"source": source}}
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+
+    assert sorted(automaton.search("ushers")) == [(1, 1), (2, 0), (2, 3)]
+
+
+def test_normalization_offsets_point_into_original_text():
+    text = "Annual  LEAVE:\n\t20 days"
+    normalized, offsets = normalize_with_offsets(text)
+
+    assert normalized == "annual leave: 20 days"
+    assert len(offsets) == len(normalized)
+    for i, ch in enumerate(normalized):
+        if ch != " ":
+            assert text[offsets[i]].lower() == ch
+
+
+def test_exact_match_maps_back_through_whitespace_and_case():
+    text = "Intro.\nEmployees   receive\n20 Days of PAID leave each year."
+    result = verify_evidence(["employees receive 20 days of paid leave"], [chunk("Other."), chunk(text, "leave.pdf")])
+
+    match = result["matches"][0]
+    assert result["score"] == 1.0
+    assert match["match"] == "exact"
+    assert match["chunk"] == 1
+    assert match["source"] == "leave.pdf"
+    assert text[match["start"]:match["end"]] == "Employees   receive\n20 Days of PAID leave"
+
+
+def test_typographic_quotes_and_wrapping_punctuation_are_ignored():
+    text = "Managers must approve \"remote work\" requests."
+    result = verify_evidence(["“Managers must approve “remote work” requests.”"], [chunk(text)])
+
+    assert result["matches"][0]["match"] == "exact"
+
+
+def test_fuzzy_fallback_tolerates_minor_differences():
+    text = "Remote work requires written approval from your manager."
+    result = verify_evidence(["remote work require written approval from you manager"], [chunk(text)])
+
+    match = result["matches"][0]
+    assert match["match"] == "fuzzy"
+    assert 0.85 <= result["score"] < 1.0
+    assert text[match["start"]:match["end"]].startswith("Remote work")
+
+
+def test_fuzzy_match_ignores_punctuation_differences():
+    text = "Requests must be approved by the team-lead, in writing."
+    result = verify_evidence(["approved by the team lead in writing"], [chunk(text)])
+
+    match = result["matches"][0]
+    assert match["match"] == "fuzzy"
+    assert text[match["start"]:match["end"]] == "approved by the team-lead, in writing"
+
+
+def test_fuzzy_match_rejects_changed_numbers():
+    text = "Employees are entitled to 20 days of paid annual leave per calendar year."
+    result = verify_evidence(["employees are entitled to 30 days of paid annual leave per calendar year"], [chunk(text)])
+
+    assert result["matches"][0]["match"] is None
+    assert result["score"] == 0.0
+
+
+def test_fuzzy_match_rejects_added_or_dropped_negations():
+    chunks = [
+        chunk("Contractors are entitled to the annual performance bonus."),
+        chunk("Unused leave may not be carried over into the next year."),
+    ]
+    evidence = [
+        "contractors are not entitled to the annual performance bonus",
+        "unused leave may be carried over into the next year",
+        "unused leave can't be carried over into the next year",
+    ]
+    result = verify_evidence(evidence, chunks)
+
+    assert [m["match"] for m in result["matches"]] == [None, None, None]
+
+
+def test_fuzzy_match_needs_an_exact_anchor():
+    text = "Remote work requires written approval from your manager."
+    result = verify_evidence(["remote wrk requires writen approval frm your managr"], [chunk(text)])
+
+    assert result["matches"][0]["match"] is None
+
+
+def test_fabricated_quote_is_unmatched():
+    result = verify_evidence(["employees get unlimited vacation"], [chunk("Employees get 20 days of leave.")])
+
+    assert result["matches"][0]["match"] is None
+    assert result["score"] == 0.0
+
+
+def test_one_match_entry_per_evidence_item():
+    evidence = ["20 days", 42, "", "not in the text at all"]
+    result = verify_evidence(evidence, [chunk("You get 20 days of leave.")])
+
+    assert [m["quote"] for m in result["matches"]] == evidence
+    assert [m["match"] for m in result["matches"]] == ["exact", None, None, None]
+    assert result["score"] == 0.25
+
+
+def test_evaluate_response_uses_context_chunks_when_given():
+    response = {
+        "answer": "You get 20 days.",
+        "evidence": ["20 days of leave"],
+        "retrieved_chunks": [chunk("Intro text. You get 20 days of leave.")]
+    }
+    truncated = [chunk("Intro text.")]
+
+    full = evaluate_response("q", response, "improved")
+    seen = evaluate_response("q", response, "improved", context_chunks=truncated)
+
+    assert full["Groundedness"] == "✅"
+    assert full["Hallucination Risk"] == "LOW"
+    assert seen["Groundedness"] == "⚠️"
+    assert seen["Hallucination Risk"] == "HIGH"